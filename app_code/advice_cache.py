@@ -0,0 +1,133 @@
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+
+
+class AdviceCache:
+    """
+    Bounded LRU + TTL cache for LLM advice, optionally persisted to a JSON file
+
+    Keys are plain strings built by the caller from the normalized prompt inputs.
+    Entries store a wall-clock timestamp so the TTL still holds after a restart.
+
+    Writes are batched: a change schedules one save save_interval seconds
+    later, and pending changes are also saved at interpreter exit. The file is
+    written outside the cache lock, so lookups never wait on disk I/O.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 24 * 3600, path: Optional[str] = None,
+                 save_interval: float = 5.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path
+        self.save_interval = save_interval
+        self.hits = 0
+        self.misses = 0
+        self.logger = logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._dirty = False
+        self._save_scheduled_pid = None
+        if self.path:
+            self._load()
+            atexit.register(self.flush)
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached value for key, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[0] <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: str):
+        """Store value under key, evicting the least recently used entries"""
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            self._mark_dirty()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._mark_dirty()
+
+    def flush(self):
+        """Write pending changes to the on-disk store now"""
+        if not self.path:
+            return
+        with self._save_lock:
+            with self._lock:
+                self._save_scheduled_pid = None
+                if not self._dirty:
+                    return
+                self._dirty = False
+                snapshot = [[key, created, value] for key, (created, value) in self._entries.items()]
+            self._save(snapshot)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl
+            }
+
+    def _load(self):
+        """Load unexpired entries from the on-disk store"""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+            now = time.time()
+            for key, created, value in stored:
+                if now - created <= self.ttl:
+                    self._entries[key] = (created, value)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            self.logger.info(f"Loaded {len(self._entries)} cached advice entries from {self.path}")
+        except Exception as e:
+            self.logger.error(f"Failed to load advice cache from {self.path}: {str(e)}")
+
+    def _mark_dirty(self):
+        """Schedule a save for the latest changes (caller holds the lock)"""
+        if not self.path:
+            return
+        self._dirty = True
+        # A timer started before a fork does not exist in the child, hence the pid check
+        if self._save_scheduled_pid != os.getpid():
+            self._save_scheduled_pid = os.getpid()
+            timer = threading.Timer(self.save_interval, self.flush)
+            timer.daemon = True
+            timer.start()
+
+    def _save(self, snapshot):
+        """Write a snapshot of the entries to the on-disk store (caller holds the save lock)"""
+        try:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            self.logger.error(f"Failed to save advice cache to {self.path}: {str(e)}")
@@ -0,0 +1,137 @@
+import json
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, Iterator
+
+# Background jobs wait this long for a generation slot; the advisor's short
+# interactive queue_timeout would turn most of them into fallback advice
+BACKGROUND_SLOT_TIMEOUT = 60.0
+
+
+class AdviceJob:
+    """
+    State of one background advice generation
+    """
+
+    def __init__(self, job_id: str):
+        self.id = job_id
+        self.status = 'pending'  # pending -> running -> done
+        self.tokens = []
+        self.advice = None
+        self.llm_available = False
+        self.created = time.time()
+        self.condition = threading.Condition()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.condition:
+            return {
+                'job_id': self.id,
+                'status': self.status,
+                'partial_advice': "".join(self.tokens),
+                'llm_advice': self.advice,
+                'llm_available': self.llm_available
+            }
+
+
+class AdviceJobManager:
+    """
+    Runs CVDLlamaAdvisor advice generation on a background executor
+
+    assess_risk submits a job and returns its id straight away; the browser then
+    polls the job or follows its token stream while Ollama generates. Workers
+    queue for the advisor's generation slots for up to slot_timeout seconds.
+    """
+
+    def __init__(self, advisor, max_workers: int = 4, max_jobs: int = 1000,
+                 slot_timeout: float = BACKGROUND_SLOT_TIMEOUT):
+        self.advisor = advisor
+        self.max_jobs = max_jobs
+        self.slot_timeout = slot_timeout
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='advice')
+        self.logger = logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, AdviceJob]" = OrderedDict()
+
+    def submit(self, risk_level: str, environmental_data: Dict, user_data: Dict) -> AdviceJob:
+        """Create a job for this profile; cached advice completes it immediately"""
+        job = AdviceJob(uuid.uuid4().hex)
+        with self._lock:
+            self._jobs[job.id] = job
+            # Forget the oldest jobs once the bound is reached
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+
+        cached_advice = self.advisor.get_cached_advice(risk_level, environmental_data, user_data)
+        if cached_advice is not None:
+            self._finish(job, cached_advice, True)
+            return job
+
+        self.executor.submit(self._run, job, risk_level, dict(environmental_data), dict(user_data))
+        return job
+
+    def get(self, job_id: str) -> Optional[AdviceJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def iter_events(self, job: AdviceJob, timeout: float = 30) -> Iterator[Dict[str, Any]]:
+        """
+        Yield {'token': ...} events as they are generated, then the final 'done' event
+
+        Stops early if no progress is made for `timeout` seconds.
+        """
+        sent = 0
+        while True:
+            with job.condition:
+                if len(job.tokens) == sent and job.status != 'done':
+                    job.condition.wait(timeout)
+                    if len(job.tokens) == sent and job.status != 'done':
+                        return
+                new_tokens = job.tokens[sent:]
+                sent = len(job.tokens)
+                done = job.status == 'done'
+
+            for token in new_tokens:
+                yield {'token': token}
+            if done:
+                yield {'done': True, 'llm_advice': job.advice, 'llm_available': job.llm_available}
+                return
+
+    def _run(self, job: AdviceJob, risk_level: str, environmental_data: Dict, user_data: Dict):
+        with job.condition:
+            job.status = 'running'
+            job.condition.notify_all()
+
+        try:
+            events = self.advisor.stream_environmental_advice(
+                risk_level, environmental_data, user_data, check_cache=False,
+                queue_timeout=self.slot_timeout
+            )
+            for event in events:
+                if event.get('done'):
+                    self._finish(job, event['advice'], event['llm_available'])
+                    return
+                with job.condition:
+                    job.tokens.append(event['token'])
+                    job.condition.notify_all()
+        except Exception as e:
+            self.logger.error(f"Advice job {job.id} failed: {str(e)}")
+
+        self._finish(job, self.advisor.get_fallback_advice(risk_level, environmental_data), False)
+
+    def _finish(self, job: AdviceJob, advice: str, llm_available: bool):
+        with job.condition:
+            job.advice = advice
+            job.llm_available = llm_available
+            job.status = 'done'
+            job.condition.notify_all()
+
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """Format an advice event as a server-sent event"""
+    name = 'done' if event.get('done') else 'token'
+    return f"event: {name}\ndata: {json.dumps(event)}\n\n"
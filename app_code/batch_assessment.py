@@ -0,0 +1,194 @@
+import io
+import numpy as np
+import pandas as pd
+from flask import request, jsonify, Response
+from data_processor import CATEGORICAL_COLUMNS
+from instrumentation import span
+
+# Raw input columns, as in expanded_health_data.csv (CVD_Risk is ignored if present)
+NUMERIC_RANGES = {
+    'Age': (18, 120),
+    'BMI': (10, 80),
+    'TotalCholesterol': (50, 600),
+    'SystolicBP': (60, 300),
+    'DiastolicBP': (30, 200),
+    'SleepHours': (0, 24)
+}
+INPUT_COLUMNS = list(NUMERIC_RANGES) + CATEGORICAL_COLUMNS
+
+# Optional caller-supplied identifier echoed back on every result row
+ID_COLUMN = 'id'
+MAX_BATCH_ROWS = 100000
+MAX_REPORTED_ERRORS = 100
+# advice=async rows per batch; kept well below the job manager's capacity so a
+# batch cannot evict the jobs of interactive users
+MAX_ASYNC_ADVICE_ROWS = 50
+STREAM_CHUNK_ROWS = 1000
+
+# pd.read_csv reads blank cells and 'None' as missing, which is how training saw them
+MISSING_CATEGORY = 'nan'
+MISSING_VALUES = (None, '', 'None')
+
+class BatchValidationError(ValueError):
+    """Raised when any row of a batch is invalid; carries per-cell errors"""
+
+    def __init__(self, message, errors=None):
+        super().__init__(message)
+        self.errors = errors or []
+
+def read_batch(req):
+    """Read a batch from a JSON array, an uploaded CSV file or a raw text/csv body"""
+    if req.is_json:
+        records = req.get_json()
+        if isinstance(records, dict):
+            records = records.get('records')
+        if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+            raise BatchValidationError("Expected a JSON array of patient records")
+        return pd.DataFrame(records)
+
+    try:
+        if 'file' in req.files:
+            return pd.read_csv(req.files['file'].stream)
+        if req.mimetype == 'text/csv':
+            return pd.read_csv(io.BytesIO(req.get_data()))
+    except (pd.errors.ParserError, pd.errors.EmptyDataError, UnicodeDecodeError) as e:
+        raise BatchValidationError(f"Could not parse CSV: {str(e)}")
+    raise BatchValidationError("Send a JSON array, a text/csv body or a CSV file upload named 'file'")
+
+def validate_batch(frame, category_codes):
+    """
+    Check every row up front and return a clean frame ready for scoring
+
+    Numeric columns must parse and fall within NUMERIC_RANGES; categorical
+    columns must hold a category the model was trained on.
+    """
+    missing = [col for col in INPUT_COLUMNS if col not in frame.columns]
+    if missing:
+        raise BatchValidationError(f"Missing columns: {', '.join(missing)}")
+    if len(frame) == 0:
+        raise BatchValidationError("Batch contains no records")
+    if len(frame) > MAX_BATCH_ROWS:
+        raise BatchValidationError(f"Batch exceeds {MAX_BATCH_ROWS} records")
+
+    clean = pd.DataFrame(index=frame.index)
+    if ID_COLUMN in frame.columns:
+        clean[ID_COLUMN] = frame[ID_COLUMN]
+
+    errors = []
+    for col, (low, high) in NUMERIC_RANGES.items():
+        values = pd.to_numeric(frame[col], errors='coerce').astype(float)
+        bad = values.isna() | (values < low) | (values > high)
+        errors.extend((row, col, f"must be a number between {low} and {high}")
+                      for row in np.flatnonzero(bad.to_numpy()))
+        clean[col] = values
+
+    for col in CATEGORICAL_COLUMNS:
+        values = frame[col].astype(object).where(frame[col].notna(), None)
+        values = values.map(lambda v: MISSING_CATEGORY if v in MISSING_VALUES else str(v))
+        bad = ~values.isin(category_codes[col])
+        allowed = sorted('None' if c == MISSING_CATEGORY else c for c in category_codes[col])
+        errors.extend((row, col, f"must be one of: {', '.join(allowed)}")
+                      for row in np.flatnonzero(bad.to_numpy()))
+        clean[col] = values
+
+    if errors:
+        errors.sort()
+        raise BatchValidationError(
+            f"{len(errors)} invalid values in {len({row for row, _, _ in errors})} records",
+            [{'row': int(row), 'column': col, 'error': message}
+             for row, col, message in errors[:MAX_REPORTED_ERRORS]]
+        )
+    return clean.reset_index(drop=True)
+
+def score_batch(model, env_index, frame):
+    """Join borough environment data in bulk and score every row with one model call"""
+    with span('env_join'):
+        env_index.join(frame)
+    predictions = model.predict_risk_batch(frame)
+
+    results = pd.DataFrame({'row': np.arange(len(frame))})
+    if ID_COLUMN in frame.columns:
+        results[ID_COLUMN] = frame[ID_COLUMN].to_numpy()
+    results['borough'] = frame['Borough'].to_numpy()
+    results['risk_prediction'] = predictions['risk_prediction']
+    results['risk_probability'] = predictions['risk_probability']
+    results['risk_level'] = predictions['risk_level']
+    results['pm25'] = frame['Avg_PM25'].to_numpy()
+    results['no2'] = frame['Avg_NO2'].to_numpy()
+    return results
+
+def _fallback_advice(advisor, results):
+    # One rule-based advice string per distinct (risk level, borough) pair
+    advice = {}
+    for risk_level, borough, pm25, no2 in results[['risk_level', 'borough', 'pm25', 'no2']].itertuples(index=False):
+        if (risk_level, borough) not in advice:
+            advice[(risk_level, borough)] = advisor.get_fallback_advice(
+                risk_level, {'borough': borough, 'pm25': pm25, 'no2': no2})
+    return [advice[key] for key in zip(results['risk_level'], results['borough'])]
+
+def _submit_advice_jobs(advice_jobs, frame, results):
+    # Jobs run on the advice executor; the response only carries their ids
+    job_ids = []
+    for record, result in zip(frame.to_dict('records'), results.to_dict('records')):
+        environmental_data = {'pm25': result['pm25'], 'no2': result['no2'], 'borough': result['borough']}
+        job_ids.append(advice_jobs.submit(result['risk_level'], environmental_data, record).id)
+    return job_ids
+
+def stream_results(results, output_format):
+    """Yield the scored rows as NDJSON lines or CSV text, a chunk at a time"""
+    for start in range(0, len(results), STREAM_CHUNK_ROWS):
+        chunk = results.iloc[start:start + STREAM_CHUNK_ROWS]
+        if output_format == 'csv':
+            yield chunk.to_csv(index=False, header=start == 0)
+        else:
+            # Older pandas omits the trailing newline after the last record
+            yield chunk.to_json(orient='records', lines=True, double_precision=15).rstrip("\n") + "\n"
+
+def register_batch_endpoint(app, model, env_index, advisor=None, advice_jobs=None):
+    """
+    Add POST /assess_risk/batch to a Flask app
+
+    Query parameters:
+        format  ndjson (default) or csv
+        advice  none (default), fallback for rule-based advice on every row, or
+                async to queue LLM advice jobs and return their ids
+    """
+
+    @app.route('/assess_risk/batch', methods=['POST'])
+    def assess_risk_batch():
+        output_format = request.args.get('format', 'ndjson')
+        advice_mode = request.args.get('advice', 'none')
+        if output_format not in ('ndjson', 'csv') or advice_mode not in ('none', 'fallback', 'async'):
+            return jsonify({
+                'success': False,
+                'error': "format must be ndjson or csv; advice must be none, fallback or async"
+            }), 400
+
+        try:
+            category_codes = model.data_processor.get_compiled_encoder().category_codes
+            with span('batch_validate'):
+                frame = validate_batch(read_batch(request), category_codes)
+            results = score_batch(model, env_index, frame)
+        except BatchValidationError as e:
+            # Anything else is a server fault and surfaces as a 500
+            return jsonify({
+                'success': False,
+                'error': str(e),
+                'errors': e.errors
+            }), 400
+
+        # Advice never waits on Ollama: queue it, or fall back to the rule-based text
+        if advice_mode == 'async' and advice_jobs is not None and advisor.is_available():
+            max_rows = min(MAX_ASYNC_ADVICE_ROWS, advice_jobs.max_jobs)
+            if len(results) > max_rows:
+                return jsonify({
+                    'success': False,
+                    'error': f"advice=async supports at most {max_rows} records per batch"
+                }), 400
+            results['advice_job_id'] = _submit_advice_jobs(advice_jobs, frame, results)
+        elif advice_mode != 'none' and advisor is not None:
+            results['llm_advice'] = _fallback_advice(advisor, results)
+
+        mimetype = 'text/csv' if output_format == 'csv' else 'application/x-ndjson'
+        return Response(stream_results(results, output_format), mimetype=mimetype,
+                        headers={'X-Batch-Rows': str(len(results))})
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the prediction, serving and training hot paths
+
+For each data scale a synthetic cohort is generated and a model is trained on
+it. That model is then used to time single-row preprocessing and prediction,
+batch scoring and the full /assess_risk request (LLM stubbed out). Results are
+printed and written as JSON so runs can be compared across commits.
+
+    python benchmark.py --scales 1000,10000 --output benchmark_results.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import tempfile
+import numpy as np
+import sklearn
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(APP_DIR))
+
+from data_collector import CVDDataCollector
+from ml_model import CVDRiskModel
+from environment_index import BoroughEnvironmentIndex
+
+BENCHMARKS = ['generate_expanded_health_data', 'train_model', 'prepare_single_prediction',
+              'predict_risk', 'predict_risk_batch', 'assess_risk_request']
+
+# Form field -> health data column for /assess_risk
+FORM_FIELDS = {
+    'age': 'Age', 'gender': 'Gender', 'smoker': 'Smoker', 'family_history': 'FamilyHistoryCVD',
+    'diabetes': 'Diabetes', 'high_bp': 'HighBloodPressure', 'activity': 'PhysicalActivityLevel',
+    'bmi': 'BMI', 'cholesterol': 'TotalCholesterol', 'systolic_bp': 'SystolicBP',
+    'diastolic_bp': 'DiastolicBP', 'alcohol': 'AlcoholConsumption', 'stress': 'StressLevel',
+    'sleep_hours': 'SleepHours', 'borough': 'Borough'
+}
+
+class StubAdvisor:
+    """Stands in for CVDLlamaAdvisor so request timings exclude Ollama"""
+
+    def is_available(self):
+        return True
+
+    def get_cached_advice(self, risk_level, environmental_data, user_data):
+        return f"Benchmark advice for {risk_level}"
+
+def summarize(latencies, items_per_call=1):
+    """Throughput and latency percentiles for a list of per-call durations in seconds"""
+    latencies = np.asarray(latencies)
+    total = float(latencies.sum())
+    return {
+        'calls': len(latencies),
+        'items_per_call': items_per_call,
+        'total_s': round(total, 4),
+        'throughput_per_s': round(len(latencies) * items_per_call / total, 1) if total else None,
+        'p50_ms': round(float(np.percentile(latencies, 50)) * 1000, 4),
+        'p95_ms': round(float(np.percentile(latencies, 95)) * 1000, 4),
+        'p99_ms': round(float(np.percentile(latencies, 99)) * 1000, 4)
+    }
+
+def time_calls(fn, args_list, warmup=3):
+    """Call fn once per argument tuple and return the per-call durations"""
+    for args in args_list[:warmup]:
+        fn(*args)
+    latencies = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+def sample_profiles(cohort, env_index, count, seed=0):
+    """Draw patient dicts from the cohort, with environmental data joined"""
+    rng = np.random.default_rng(seed)
+    rows = cohort.drop(columns=['CVD_Risk']).iloc[rng.integers(0, len(cohort), count)]
+    profiles = rows.to_dict('records')
+    for profile in profiles:
+        # pd.read_csv turns 'None' into NaN; the generated frame still holds the string
+        if profile['AlcoholConsumption'] == 'None':
+            profile['AlcoholConsumption'] = np.nan
+        env_index.apply(profile)
+    return profiles
+
+def run_scale(scale, args, env_index, workdir):
+    collector = CVDDataCollector()
+    results = {}
+    selected = set(args.only or BENCHMARKS)
+
+    if 'generate_expanded_health_data' in selected:
+        latencies = time_calls(collector.generate_expanded_health_data, [(scale,)] * args.train_repeats, warmup=0)
+        results['generate_expanded_health_data'] = summarize(latencies, scale)
+
+    # Train on a vectorized cohort of this size written where the data processor reads it
+    health_path = os.path.join(workdir, f'health_{scale}.csv')
+    cohort = collector.generate_health_data_vectorized(scale, seed=args.seed)
+    cohort.to_csv(health_path, index=False)
+
+    model = None
+    def train():
+        nonlocal model
+        model = CVDRiskModel(prediction_cache_size=0)
+        model.data_processor.health_data_path = health_path
+        # Time the full CSV parse and encode on every run, not the dataset cache
+        model.data_processor.dataset_cache_dir = None
+        model.train_model(cv=args.cv)
+
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        latencies = time_calls(train, [()] * args.train_repeats, warmup=0)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    if 'train_model' in selected:
+        results['train_model'] = summarize(latencies, scale)
+
+    profiles = sample_profiles(cohort, env_index, args.repeat, seed=args.seed)
+    calls = [(profile,) for profile in profiles]
+
+    if 'prepare_single_prediction' in selected:
+        latencies = time_calls(model.data_processor.prepare_single_prediction, calls)
+        results['prepare_single_prediction'] = summarize(latencies)
+
+    if 'predict_risk' in selected:
+        results['predict_risk'] = summarize(time_calls(model.predict_risk, calls))
+
+    if 'predict_risk_batch' in selected:
+        batch = sample_profiles(cohort, env_index, min(scale, args.batch_size), seed=args.seed + 1)
+        latencies = time_calls(model.predict_risk_batch, [(batch,)] * args.batch_repeats, warmup=1)
+        results['predict_risk_batch'] = summarize(latencies, len(batch))
+
+    if 'assess_risk_request' in selected:
+        results['assess_risk_request'] = bench_assess_risk(model, cohort, args)
+
+    return results
+
+def bench_assess_risk(model, cohort, args):
+    """Time POST /assess_risk end to end through Flask's test client"""
+    import web_app
+    from advice_jobs import AdviceJobManager
+
+    stub = StubAdvisor()
+    web_app.model = model
+    web_app.llm_advisor = stub
+    web_app.advice_jobs = AdviceJobManager(stub)
+    web_app.LLM_AVAILABLE = True
+    client = web_app.app.test_client()
+
+    rng = np.random.default_rng(args.seed + 2)
+    rows = cohort.iloc[rng.integers(0, len(cohort), args.repeat)]
+    forms = [({field: str(row[column]) for field, column in FORM_FIELDS.items()},)
+             for row in rows.to_dict('records')]
+
+    def post(form):
+        response = client.post('/assess_risk', data=form)
+        if response.status_code != 200:
+            raise RuntimeError(f"/assess_risk returned {response.status_code}: {response.get_data(as_text=True)}")
+
+    return summarize(time_calls(post, forms))
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=APP_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+def print_results(scale, results):
+    print(f"\nScale: {scale} records")
+    print(f"{'benchmark':<32}{'throughput/s':>14}{'p50 ms':>12}{'p95 ms':>12}{'p99 ms':>12}")
+    for name, stats in results.items():
+        print(f"{name:<32}{stats['throughput_per_s']:>14}{stats['p50_ms']:>12.3f}"
+              f"{stats['p95_ms']:>12.3f}{stats['p99_ms']:>12.3f}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the CVD risk prediction hot paths')
+    parser.add_argument('--scales', default='1000,10000',
+                        help='Comma-separated cohort sizes to generate, train on and score')
+    parser.add_argument('--repeat', type=int, default=500, help='Timed calls per single-row benchmark')
+    parser.add_argument('--batch-size', type=int, default=10000, help='Rows per batch scoring call')
+    parser.add_argument('--batch-repeats', type=int, default=10, help='Timed batch scoring calls')
+    parser.add_argument('--train-repeats', type=int, default=1,
+                        help='Timed runs of train_model and data generation')
+    parser.add_argument('--cv', type=int, default=5, help='Cross-validation folds for train_model')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--only', type=lambda s: s.split(','), help=f"Subset of: {','.join(BENCHMARKS)}")
+    parser.add_argument('--output', default='benchmark_results.json', help='JSON results file')
+    args = parser.parse_args()
+
+    # Data files are resolved relative to the app directory
+    os.chdir(APP_DIR)
+    env_index = BoroughEnvironmentIndex()
+
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'scikit_learn': sklearn.__version__,
+        'cpu_count': os.cpu_count(),
+        'settings': {key: value for key, value in vars(args).items() if key != 'output'},
+        'scales': {}
+    }
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for scale in (int(s) for s in args.scales.split(',')):
+            results = run_scale(scale, args, env_index, workdir)
+            report['scales'][str(scale)] = results
+            print_results(scale, results)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import time
+import logging
+import threading
+from typing import Callable, Dict, Any, Optional
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for calls to a slow or failing dependency
+
+    closed     calls go through; consecutive failures (errors or calls slower
+               than slow_call_seconds) are counted
+    open       after failure_threshold of them every call is refused at once; a
+               background thread runs `probe` every probe_interval seconds (with
+               no probe, the interval simply elapses)
+    half_open  once the probe succeeds a single trial call is let through; its
+               outcome closes the breaker or opens it again
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 3, slow_call_seconds: float = 10.0,
+                 probe_interval: float = 15.0, probe: Optional[Callable[[], bool]] = None):
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.probe_interval = probe_interval
+        self.probe = probe
+        self.logger = logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self.rejected = 0
+        self._trial_in_flight = False
+        self._probing = False
+
+    def allow_request(self) -> bool:
+        """Whether a call may go ahead now; in half_open only one trial at a time"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if (self.state == self.OPEN and self.probe is None
+                    and time.time() - self.opened_at >= self.probe_interval):
+                # Without a probe, simply allow a trial once the interval has passed
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def cancel(self):
+        """Give back an admission that did not turn into a call"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record(self, succeeded: bool, elapsed: float):
+        """Report the outcome of an admitted call"""
+        failed = not succeeded or elapsed > self.slow_call_seconds
+        with self._lock:
+            self._trial_in_flight = False
+            if not failed:
+                if self.state != self.CLOSED:
+                    self.logger.info("Circuit closed: dependency recovered")
+                self.state = self.CLOSED
+                self.consecutive_failures = 0
+                return
+
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                self._open()
+
+    def _open(self):
+        # Caller holds the lock
+        if self.state != self.OPEN:
+            self.times_opened += 1
+            self.logger.warning(f"Circuit opened after {self.consecutive_failures} failed or slow calls")
+        self.state = self.OPEN
+        self.opened_at = time.time()
+        if self.probe is not None and not self._probing:
+            self._probing = True
+            threading.Thread(target=self._probe_until_recovered, daemon=True).start()
+
+    def _probe_until_recovered(self):
+        while True:
+            time.sleep(self.probe_interval)
+            try:
+                recovered = self.probe()
+            except Exception:
+                recovered = False
+            if recovered:
+                with self._lock:
+                    self._probing = False
+                    if self.state == self.OPEN:
+                        self.state = self.HALF_OPEN
+                return
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'times_opened': self.times_opened,
+                'rejected': self.rejected,
+                'opened_at': self.opened_at
+            }
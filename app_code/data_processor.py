@@ -3,20 +3,112 @@ import numpy as np
 from sklearn.preprocessing import LabelEncoder, StandardScaler
 from sklearn.model_selection import train_test_split
 import os
+from dataset_cache import dataset_key, has_dataset, save_dataset, load_dataset
+
+# Categorical inputs label-encoded into <column>_encoded features
+CATEGORICAL_COLUMNS = ['Gender', 'Smoker', 'FamilyHistoryCVD', 'Diabetes', 
+                       'HighBloodPressure', 'PhysicalActivityLevel', 'AlcoholConsumption',
+                       'StressLevel', 'Borough']
+
+# Model features, in the column order the model was trained on
+FEATURE_COLUMNS = ['Age', 'Gender_encoded', 'Smoker_encoded', 'FamilyHistoryCVD_encoded',
+                   'Diabetes_encoded', 'HighBloodPressure_encoded', 'PhysicalActivityLevel_encoded',
+                   'AlcoholConsumption_encoded', 'StressLevel_encoded', 'Borough_encoded',
+                   'BMI', 'TotalCholesterol', 'SystolicBP', 'DiastolicBP', 'SleepHours',
+                   'Avg_PM25', 'Avg_NO2', 'NoiseLevel_dB', 'GreenSpacePercent', 
+                   'WalkabilityScore', 'UrbanHeatIncrease']
+
+ENV_FEATURE_COLUMNS = ['Avg_PM25', 'Avg_NO2', 'NoiseLevel_dB', 'GreenSpacePercent',
+                       'WalkabilityScore', 'UrbanHeatIncrease']
+
+# Compact dtypes for streaming the health CSV
+HEALTH_DTYPES = {
+    **{col: 'category' for col in CATEGORICAL_COLUMNS},
+    'Age': 'float32',
+    'BMI': 'float32',
+    'TotalCholesterol': 'float32',
+    'SystolicBP': 'float32',
+    'DiastolicBP': 'float32',
+    'SleepHours': 'float32',
+    'CVD_Risk': 'int8'
+}
+
+class CompiledFeatureEncoder:
+    """Pandas-free encoder compiled from a fitted CVDDataProcessor
+    
+    Holds category -> code dicts for each label encoder and the scaler's
+    mean/scale arrays, so a user dict becomes a scaled float64 row directly.
+    """
+    def __init__(self, label_encoders, scaler, feature_columns):
+        self.feature_columns = list(feature_columns)
+        self.category_codes = {
+            col: {str(label): code for code, label in enumerate(encoder.classes_)}
+            for col, encoder in label_encoders.items()
+        }
+        
+        n_features = len(self.feature_columns)
+        self.mean = np.asarray(scaler.mean_, dtype=np.float64) if scaler.with_mean else np.zeros(n_features)
+        self.scale = np.asarray(scaler.scale_, dtype=np.float64) if scaler.with_std else np.ones(n_features)
+        
+        # For each feature: the input key to read and the code dict if it is categorical
+        self._plan = []
+        for feature in self.feature_columns:
+            source = feature[:-len('_encoded')] if feature.endswith('_encoded') else feature
+            self._plan.append((source, self.category_codes.get(source) if source != feature else None))
+    
+    def transform_one(self, user_input):
+        """Encode and scale a single user dict into a 1-D float64 row"""
+        # Unseen categories map to 0, as in the pandas path
+        row = np.array([
+            codes.get(str(user_input[source]), 0) if codes is not None else user_input[source]
+            for source, codes in self._plan
+        ], dtype=np.float64)
+        row -= self.mean
+        row /= self.scale
+        return row
+    
+    def scale_rows(self, X):
+        """Scale an already-encoded 2-D float64 matrix in feature_columns order"""
+        return (X - self.mean) / self.scale
+
 
 class CVDDataProcessor:
-    def __init__(self):
+    health_data_path = '../user_data/expanded_health_data.csv'
+    env_data_path = '../environmental_data/expanded_environmental_data.csv'
+    # Binary cache of the encoded training matrix; CVD_DATASET_CACHE_DIR='' disables it
+    dataset_cache_dir = os.environ.get('CVD_DATASET_CACHE_DIR', '../dataset_cache') or None
+    
+    def __init__(self, health_data_path=None, env_data_path=None):
+        if health_data_path:
+            self.health_data_path = health_data_path
+        if env_data_path:
+            self.env_data_path = env_data_path
         self.label_encoders = {}
         self.scaler = StandardScaler()
         self.feature_columns = []
+        self._compiled_encoder = None
+    
+    def __getstate__(self):
+        # The compiled encoder is derived state; rebuild it after unpickling
+        state = self.__dict__.copy()
+        state.pop('_compiled_encoder', None)
+        return state
+    
+    def get_compiled_encoder(self):
+        """Return the CompiledFeatureEncoder for the fitted encoders and scaler"""
+        if getattr(self, '_compiled_encoder', None) is None:
+            self._compiled_encoder = CompiledFeatureEncoder(
+                self.label_encoders, self.scaler, self.feature_columns
+            )
+        return self._compiled_encoder
         
     def load_data(self):
         """Load and merge health and environmental data"""
         # Load expanded health data
-        health_data = pd.read_csv('../user_data/expanded_health_data.csv')
+        health_data = pd.read_csv(self.health_data_path)
         
         # Load expanded environmental data
-        env_data = pd.read_csv('../environmental_data/expanded_environmental_data.csv')
+        env_data = pd.read_csv(self.env_data_path)
         
         # Merge data on Borough
         merged_data = health_data.merge(env_data, on='Borough', how='left')
@@ -29,23 +121,14 @@ class CVDDataProcessor:
         data = data.fillna(data.median(numeric_only=True))
         
         # Encode categorical variables
-        categorical_columns = ['Gender', 'Smoker', 'FamilyHistoryCVD', 'Diabetes', 
-                             'HighBloodPressure', 'PhysicalActivityLevel', 'AlcoholConsumption',
-                             'StressLevel', 'Borough']
-        
-        for col in categorical_columns:
+        for col in CATEGORICAL_COLUMNS:
             if col in data.columns:
                 le = LabelEncoder()
                 data[col + '_encoded'] = le.fit_transform(data[col].astype(str))
                 self.label_encoders[col] = le
         
         # Select features for model
-        feature_columns = ['Age', 'Gender_encoded', 'Smoker_encoded', 'FamilyHistoryCVD_encoded',
-                          'Diabetes_encoded', 'HighBloodPressure_encoded', 'PhysicalActivityLevel_encoded',
-                          'AlcoholConsumption_encoded', 'StressLevel_encoded', 'Borough_encoded',
-                          'BMI', 'TotalCholesterol', 'SystolicBP', 'DiastolicBP', 'SleepHours',
-                          'Avg_PM25', 'Avg_NO2', 'NoiseLevel_dB', 'GreenSpacePercent', 
-                          'WalkabilityScore', 'UrbanHeatIncrease']
+        feature_columns = list(FEATURE_COLUMNS)
         
         self.feature_columns = feature_columns
         X = data[feature_columns]
@@ -54,25 +137,191 @@ class CVDDataProcessor:
         # Scale numerical features with robust scaling
         self.scaler = StandardScaler()
         X_scaled = self.scaler.fit_transform(X)
+        self._compiled_encoder = None
         
         return X_scaled, y, data
     
+    def load_training_data(self, streaming=False):
+        """Return the encoded, scaled training matrix (X, y), fitting the encoders and scaler
+        
+        When the source CSVs are byte-identical to a cached run, X and y are
+        memory-mapped from dataset_cache_dir and the fitted state is restored
+        from it, skipping CSV parsing, merging and encoding.
+        """
+        loader = 'streaming' if streaming else 'full'
+        entry = None
+        if self.dataset_cache_dir:
+            key = dataset_key([self.health_data_path, self.env_data_path], loader)
+            entry = os.path.join(self.dataset_cache_dir, key)
+            if has_dataset(entry):
+                return load_dataset(entry, self)
+        
+        if streaming:
+            X, y = self.load_data_streaming()
+        else:
+            X, y, _ = self.preprocess_data(self.load_data())
+            y = y.to_numpy()
+        
+        if entry is not None:
+            try:
+                os.makedirs(self.dataset_cache_dir, exist_ok=True)
+                save_dataset(entry, X, y, self, [self.health_data_path, self.env_data_path])
+            except OSError as e:
+                print(f"Warning: could not write dataset cache: {str(e)}")
+        return X, y
+    
+    def load_data_streaming(self, chunksize=100000, out_path=None):
+        """Load, encode and scale the training data chunk by chunk with bounded memory
+        
+        Streaming counterpart of load_data + preprocess_data. The health CSV is
+        read twice in chunks with compact dtypes: once to collect categories and
+        numeric means, once to encode each chunk, join it against the borough
+        table through a dict lookup and partial_fit the scaler. Missing numeric
+        values are filled with column means, as exact medians need the full data.
+        
+        Returns (X_scaled, y) as float32 and int8 arrays. Pass out_path to back
+        X with a memory-mapped .npy file instead of RAM.
+        """
+        # Pass 1: categories, row count and numeric means
+        categories = {col: set() for col in CATEGORICAL_COLUMNS}
+        numeric_columns = [col for col, dtype in HEALTH_DTYPES.items() if dtype == 'float32']
+        sums = {col: 0.0 for col in numeric_columns}
+        counts = {col: 0 for col in numeric_columns}
+        n_rows = 0
+        
+        for chunk in self._read_health_chunks(chunksize):
+            n_rows += len(chunk)
+            for col in CATEGORICAL_COLUMNS:
+                categories[col].update(str(c) for c in chunk[col].cat.categories)
+                if chunk[col].isna().any():
+                    categories[col].add('nan')
+            for col in numeric_columns:
+                sums[col] += float(np.nansum(chunk[col].to_numpy(dtype=np.float64)))
+                counts[col] += int(chunk[col].count())
+        fill_values = {col: sums[col] / counts[col] if counts[col] else 0.0 for col in numeric_columns}
+        
+        for col in CATEGORICAL_COLUMNS:
+            le = LabelEncoder()
+            le.fit(sorted(categories[col]))
+            self.label_encoders[col] = le
+        codes = {col: {label: code for code, label in enumerate(le.classes_)}
+                 for col, le in self.label_encoders.items()}
+        
+        # Borough table: one env row per borough code, plus a fallback row of means
+        env_data = pd.read_csv(self.env_data_path)
+        env_by_borough = {row[0]: np.asarray(row[1:], dtype=np.float64)
+                          for row in env_data[['Borough'] + ENV_FEATURE_COLUMNS].itertuples(index=False)}
+        env_fallback = env_data[ENV_FEATURE_COLUMNS].mean().to_numpy(dtype=np.float64)
+        env_matrix = np.vstack([env_by_borough.get(label, env_fallback)
+                                for label in self.label_encoders['Borough'].classes_])
+        
+        # Pass 2: encode, join and fit the scaler incrementally into a preallocated matrix
+        self.feature_columns = list(FEATURE_COLUMNS)
+        n_features = len(self.feature_columns)
+        if out_path:
+            X = np.lib.format.open_memmap(out_path, mode='w+', dtype=np.float32, shape=(n_rows, n_features))
+        else:
+            X = np.empty((n_rows, n_features), dtype=np.float32)
+        y = np.empty(n_rows, dtype=np.int8)
+        self.scaler = StandardScaler()
+        
+        start = 0
+        for chunk in self._read_health_chunks(chunksize):
+            stop = start + len(chunk)
+            block = np.empty((len(chunk), n_features), dtype=np.float64)
+            encoded = {}
+            for col in CATEGORICAL_COLUMNS:
+                series = chunk[col]
+                # Map each chunk category (and NaN, code -1) to its label code
+                lookup = np.array([codes[col].get(str(c), 0) for c in series.cat.categories]
+                                  + [codes[col].get('nan', 0)], dtype=np.int64)
+                encoded[col] = lookup[series.cat.codes.to_numpy()]
+            
+            env_block = env_matrix[encoded['Borough']]
+            for idx, feature in enumerate(self.feature_columns):
+                if feature.endswith('_encoded'):
+                    block[:, idx] = encoded[feature[:-len('_encoded')]]
+                elif feature in ENV_FEATURE_COLUMNS:
+                    block[:, idx] = env_block[:, ENV_FEATURE_COLUMNS.index(feature)]
+                else:
+                    block[:, idx] = chunk[feature].fillna(fill_values[feature]).to_numpy(dtype=np.float64)
+            
+            self.scaler.partial_fit(block)
+            X[start:stop] = block
+            y[start:stop] = chunk['CVD_Risk'].to_numpy()
+            start = stop
+        
+        # Scale in place once the statistics over every chunk are known
+        mean = self.scaler.mean_.astype(np.float32)
+        scale = self.scaler.scale_.astype(np.float32)
+        for block_start in range(0, n_rows, chunksize):
+            block = X[block_start:block_start + chunksize]
+            block -= mean
+            block /= scale
+        
+        self._compiled_encoder = None
+        return X, y
+    
+    def _read_health_chunks(self, chunksize):
+        """Iterate over the health CSV with compact dtypes"""
+        return pd.read_csv(self.health_data_path, dtype=HEALTH_DTYPES, chunksize=chunksize)
+    
+    def load_new_records(self, records):
+        """Load newly arrived health records (CSV path or DataFrame) merged with environmental data"""
+        health_data = pd.read_csv(records) if isinstance(records, str) else records
+        if all(col in health_data.columns for col in ENV_FEATURE_COLUMNS):
+            return health_data
+        env_data = pd.read_csv(self.env_data_path)
+        return health_data.merge(env_data, on='Borough', how='left')
+    
+    def transform_new_records(self, data):
+        """Encode and scale labelled new records with the fitted encoders and scaler
+        
+        Nothing is refitted, so the rows line up with the existing model. Missing
+        numeric values are filled with the training means (0 once scaled).
+        Returns (X_scaled, y, unseen_rate), where unseen_rate is the share of
+        records holding a category the label encoders never saw.
+        """
+        encoder = self.get_compiled_encoder()
+        unseen = np.zeros(len(data), dtype=bool)
+        for col, codes in encoder.category_codes.items():
+            if col in data.columns:
+                unseen |= ~data[col].map(str).isin(list(codes)).to_numpy()
+        
+        X_scaled = np.nan_to_num(self.prepare_batch_prediction(data), nan=0.0)
+        y = data['CVD_Risk'].to_numpy()
+        return X_scaled, y, float(unseen.mean()) if len(data) else 0.0
+    
     def prepare_single_prediction(self, user_input):
         """Prepare single user input for prediction"""
-        # Create DataFrame from user input
-        input_df = pd.DataFrame([user_input])
+        # Compatibility shim over the compiled fast path; returns a (1, n_features) array
+        return self.get_compiled_encoder().transform_one(user_input).reshape(1, -1)
+    
+    def prepare_batch_prediction(self, user_inputs):
+        """Prepare many user inputs for prediction in a single vectorized pass
+
+        Accepts a DataFrame or list of dicts with the raw input columns, or a
+        2-D NumPy array whose columns are already encoded in feature_columns order.
+        """
+        if isinstance(user_inputs, np.ndarray):
+            X_input = np.atleast_2d(np.asarray(user_inputs, dtype=np.float64))
+            if X_input.shape[1] != len(self.feature_columns):
+                raise ValueError(
+                    f"Expected {len(self.feature_columns)} feature columns, got {X_input.shape[1]}"
+                )
+            return self.get_compiled_encoder().scale_rows(X_input)
         
-        # Encode categorical variables using fitted encoders
-        for col, encoder in self.label_encoders.items():
+        if isinstance(user_inputs, pd.DataFrame):
+            input_df = user_inputs.copy()
+        else:
+            input_df = pd.DataFrame(list(user_inputs))
+        
+        # Encode each categorical column with one dict lookup; unseen categories map to 0
+        encoder = self.get_compiled_encoder()
+        for col, codes in encoder.category_codes.items():
             if col in input_df.columns:
-                try:
-                    input_df[col + '_encoded'] = encoder.transform(input_df[col].astype(str))
-                except ValueError:
-                    # Handle unseen categories
-                    input_df[col + '_encoded'] = 0
+                input_df[col + '_encoded'] = input_df[col].map(str).map(codes).fillna(0)
         
         # Select and scale features
-        X_input = input_df[self.feature_columns]
-        X_scaled = self.scaler.transform(X_input)
-        
-        return X_scaled
\ No newline at end of file
+        X_input = input_df[self.feature_columns].to_numpy(dtype=np.float64)
+        return encoder.scale_rows(X_input)
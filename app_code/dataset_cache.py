@@ -0,0 +1,107 @@
+"""
+Binary cache of the merged, encoded and scaled training dataset
+
+Each entry is a directory named after a content hash of the source CSVs (and
+the loader used), holding X.npy, y.npy and a JSON manifest with the fitted
+label encoder categories and scaler parameters. A later training run over the
+same CSVs memory-maps the matrices instead of parsing, merging and encoding
+again; any edit to either CSV changes the hash and misses the cache.
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+import numpy as np
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+DATASET_CACHE_FORMAT_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+
+# Entries kept per cache directory; older ones are removed when a new one is written
+MAX_CACHED_DATASETS = 3
+
+
+def dataset_key(sources, loader):
+    """Hash the bytes of every source file together with the loader that encodes them"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{DATASET_CACHE_FORMAT_VERSION}:{loader}".encode())
+    for path in sources:
+        digest.update(b'\0')
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def has_dataset(path):
+    # The manifest is written last, so its presence marks a complete entry
+    return os.path.exists(os.path.join(path, MANIFEST_NAME))
+
+
+def save_dataset(path, X, y, data_processor, sources):
+    """Write a training matrix and the processor state that produced it"""
+    scaler = data_processor.scaler
+    manifest = {
+        'format_version': DATASET_CACHE_FORMAT_VERSION,
+        'sources': [os.path.abspath(source) for source in sources],
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'rows': int(len(y)),
+        'feature_columns': list(data_processor.feature_columns),
+        'categories': {col: [str(label) for label in encoder.classes_]
+                       for col, encoder in data_processor.label_encoders.items()},
+        'scaler_mean': [float(v) for v in scaler.mean_],
+        'scaler_var': [float(v) for v in scaler.var_],
+        'scaler_scale': [float(v) for v in scaler.scale_],
+        'scaler_n_samples_seen': int(np.max(scaler.n_samples_seen_))
+    }
+
+    # Write to a sibling directory and swap it in so readers never see a partial entry
+    tmp_path = path.rstrip(os.sep) + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    np.save(os.path.join(tmp_path, 'X.npy'), np.ascontiguousarray(X))
+    np.save(os.path.join(tmp_path, 'y.npy'), np.ascontiguousarray(y))
+    with open(os.path.join(tmp_path, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    _prune(os.path.dirname(os.path.abspath(path)))
+    return manifest
+
+
+def load_dataset(path, data_processor, mmap_mode='r'):
+    """Memory-map a cached (X, y) and restore the fitted encoders and scaler onto data_processor"""
+    with open(os.path.join(path, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('format_version') != DATASET_CACHE_FORMAT_VERSION:
+        raise ValueError(f"Unsupported dataset cache format version: {manifest.get('format_version')}")
+
+    X = np.load(os.path.join(path, 'X.npy'), mmap_mode=mmap_mode)
+    y = np.load(os.path.join(path, 'y.npy'), mmap_mode=mmap_mode)
+
+    data_processor.feature_columns = manifest['feature_columns']
+    data_processor.label_encoders = {}
+    for col, labels in manifest['categories'].items():
+        encoder = LabelEncoder()
+        encoder.classes_ = np.asarray(labels, dtype=object)
+        data_processor.label_encoders[col] = encoder
+    scaler = StandardScaler()
+    scaler.mean_ = np.asarray(manifest['scaler_mean'], dtype=np.float64)
+    scaler.var_ = np.asarray(manifest['scaler_var'], dtype=np.float64)
+    scaler.scale_ = np.asarray(manifest['scaler_scale'], dtype=np.float64)
+    scaler.n_features_in_ = len(manifest['feature_columns'])
+    scaler.n_samples_seen_ = manifest['scaler_n_samples_seen']
+    data_processor.scaler = scaler
+    data_processor._compiled_encoder = None
+
+    return X, y
+
+
+def _prune(cache_dir):
+    """Remove all but the newest MAX_CACHED_DATASETS complete entries"""
+    entries = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir)]
+    entries = sorted((entry for entry in entries if has_dataset(entry)), key=os.path.getmtime, reverse=True)
+    for entry in entries[MAX_CACHED_DATASETS:]:
+        shutil.rmtree(entry, ignore_errors=True)
@@ -0,0 +1,100 @@
+import os
+import time
+import logging
+import threading
+from typing import Dict, Optional
+
+import pandas as pd
+
+# Environmental columns joined onto every patient record
+ENV_COLUMNS = ['Avg_PM25', 'Avg_NO2', 'NoiseLevel_dB', 'GreenSpacePercent',
+               'WalkabilityScore', 'UrbanHeatIncrease']
+
+DEFAULT_ENV_DATA_PATH = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)),
+    '..', 'environmental_data', 'expanded_environmental_data.csv'
+)
+
+
+class BoroughEnvironmentIndex:
+    """
+    In-memory borough -> environmental factors lookup shared by the web front-ends
+
+    The CSV is read once into a dict keyed by borough, together with the column
+    means used for unknown boroughs. The file's mtime is re-checked at most every
+    `check_interval` seconds and the index is rebuilt when it changes.
+    """
+
+    def __init__(self, csv_path: str = DEFAULT_ENV_DATA_PATH, check_interval: float = 1.0):
+        self.csv_path = csv_path
+        self.check_interval = check_interval
+        self.version = 0
+        self.logger = logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._last_check = 0.0
+        self._records: Dict[str, Dict[str, float]] = {}
+        self._fallback: Dict[str, float] = {}
+        self._load()
+
+    def _load(self):
+        """Read the CSV and swap in a freshly built index"""
+        mtime = os.path.getmtime(self.csv_path)
+        env_data = pd.read_csv(self.csv_path)
+
+        records = {}
+        for row in env_data[['Borough'] + ENV_COLUMNS].itertuples(index=False):
+            records[row[0]] = {col: float(value) for col, value in zip(ENV_COLUMNS, row[1:])}
+        fallback = {col: float(env_data[col].mean()) for col in ENV_COLUMNS}
+
+        # Readers always see a complete (records, fallback) pair
+        self._records, self._fallback = records, fallback
+        self._mtime = mtime
+        self.version += 1
+        self.logger.info(f"Loaded environmental data for {len(records)} boroughs from {self.csv_path}")
+
+    def _maybe_reload(self):
+        """Reload the index if the CSV changed since it was last read"""
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+
+        with self._lock:
+            if now - self._last_check < self.check_interval:
+                return
+            self._last_check = now
+            try:
+                if os.path.getmtime(self.csv_path) != self._mtime:
+                    self._load()
+            except Exception as e:
+                # Keep serving the last good index if the file is missing or mid-write
+                self.logger.error(f"Failed to reload environmental data: {str(e)}")
+
+    def lookup(self, borough: str) -> Dict[str, float]:
+        """Return the environmental factors for a borough, or the London means if unknown"""
+        self._maybe_reload()
+        return dict(self._records.get(borough, self._fallback))
+
+    def apply(self, user_data: Dict) -> Dict:
+        """Add the environmental factors for user_data['Borough'] to user_data in place"""
+        user_data.update(self.lookup(user_data['Borough']))
+        return user_data
+
+    def join(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """Add the environmental columns to a DataFrame of patients in one vectorized pass"""
+        self._maybe_reload()
+        records, fallback = self._records, self._fallback
+        for col in ENV_COLUMNS:
+            by_borough = {borough: values[col] for borough, values in records.items()}
+            frame[col] = frame['Borough'].map(by_borough).fillna(fallback[col]).astype(float)
+        return frame
+
+    def boroughs(self) -> list:
+        """List the boroughs present in the environmental data"""
+        self._maybe_reload()
+        return list(self._records)
+
+    def has_borough(self, borough: Optional[str]) -> bool:
+        self._maybe_reload()
+        return borough in self._records
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Ollama API, for load and latency testing without a model
+
+Implements GET /api/tags and POST /api/generate (streaming and non-streaming)
+with seeded, configurable latency, error and timeout behaviour. Point the apps
+at it with OLLAMA_URL:
+
+    python fake_ollama.py --port 11435 --latency lognormal:0.8,0.5 --error-rate 0.05
+    OLLAMA_URL=http://127.0.0.1:11435 python web_app.py
+
+Latency distributions (seconds), sampled per request as time to first token:
+    fixed:S  uniform:LOW,HIGH  normal:MEAN,SD  lognormal:MEDIAN,SIGMA  exponential:MEAN
+
+GET /fake/stats reports request, error and timeout counters.
+"""
+import json
+import time
+import random
+import argparse
+import threading
+import http.server
+from datetime import datetime, timezone
+
+DEFAULT_RESPONSE = (
+    "1. Exercise in green spaces away from main roads, ideally early in the morning "
+    "when pollution is lowest. 2. Check the London Air Quality forecast before outdoor "
+    "activity and move workouts indoors on high pollution days. 3. Keep up regular "
+    "check-ups to monitor blood pressure and cholesterol."
+)
+
+
+def parse_latency(spec):
+    """Turn a 'kind:params' spec into a sampler taking a random.Random"""
+    kind, _, params = spec.partition(':')
+    values = [float(v) for v in params.split(',') if v]
+    samplers = {
+        'fixed': lambda rng: values[0],
+        'uniform': lambda rng: rng.uniform(values[0], values[1]),
+        'normal': lambda rng: rng.gauss(values[0], values[1]),
+        'lognormal': lambda rng: values[0] * rng.lognormvariate(0, values[1]),
+        'exponential': lambda rng: rng.expovariate(1 / values[0])
+    }
+    if kind not in samplers:
+        raise ValueError(f"Unknown latency distribution: {kind}")
+    sampler = samplers[kind]
+    return lambda rng: max(0.0, sampler(rng))
+
+
+class FakeOllamaConfig:
+    """Behaviour of the fake server; draws come from one seeded generator"""
+
+    def __init__(self, model='llama3.2:3b', latency='fixed:0.5', token_interval=0.02,
+                 error_rate=0.0, error_status=500, timeout_rate=0.0, hang_seconds=60.0,
+                 tags_latency=0.0, response_text=DEFAULT_RESPONSE, seed=42):
+        self.model = model
+        self.latency_spec = latency
+        self.sample_latency = parse_latency(latency)
+        self.token_interval = token_interval
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.timeout_rate = timeout_rate
+        self.hang_seconds = hang_seconds
+        self.tags_latency = tags_latency
+        self.tokens = [word + ' ' for word in response_text.split()]
+        self.tokens[-1] = self.tokens[-1].rstrip()
+
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {'tags': 0, 'generate': 0, 'errors': 0, 'timeouts': 0}
+
+    def draw(self):
+        """Decide the fate of one generate request: ('error' | 'timeout' | 'ok', latency)"""
+        with self._lock:
+            self.stats['generate'] += 1
+            roll = self._rng.random()
+            latency = self.sample_latency(self._rng)
+            if roll < self.error_rate:
+                self.stats['errors'] += 1
+                return 'error', latency
+            if roll < self.error_rate + self.timeout_rate:
+                self.stats['timeouts'] += 1
+                return 'timeout', latency
+            return 'ok', latency
+
+    def count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+
+class FakeOllamaHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    config = FakeOllamaConfig()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == '/api/tags':
+            self.config.count('tags')
+            time.sleep(self.config.tags_latency)
+            return self._send_json(200, {'models': [{'name': self.config.model, 'model': self.config.model}]})
+        if self.path == '/fake/stats':
+            return self._send_json(200, dict(self.config.stats))
+        self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        if self.path != '/api/generate':
+            return self._send_json(404, {'error': 'not found'})
+
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            payload = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            return self._send_json(400, {'error': 'invalid JSON'})
+        if payload.get('model') != self.config.model:
+            return self._send_json(404, {'error': f"model '{payload.get('model')}' not found"})
+
+        outcome, latency = self.config.draw()
+        if outcome == 'error':
+            time.sleep(latency)
+            return self._send_json(self.config.error_status, {'error': 'simulated failure'})
+        if outcome == 'timeout':
+            # Hold the connection without answering, then drop it
+            time.sleep(self.config.hang_seconds)
+            self.close_connection = True
+            return
+
+        time.sleep(latency)
+        if payload.get('stream', True):
+            self._stream_tokens()
+        else:
+            time.sleep(self.config.token_interval * len(self.config.tokens))
+            self._send_json(200, self._chunk("".join(self.config.tokens), done=True))
+
+    def _chunk(self, text, done):
+        chunk = {
+            'model': self.config.model,
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'response': text,
+            'done': done
+        }
+        if done:
+            chunk['done_reason'] = 'stop'
+        return chunk
+
+    def _stream_tokens(self):
+        # Newline-delimited JSON chunks, as Ollama sends them, with chunked encoding
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        try:
+            for i, token in enumerate(self.config.tokens):
+                if i:
+                    time.sleep(self.config.token_interval)
+                self._write_chunk(json.dumps(self._chunk(token, done=False)) + "\n")
+            self._write_chunk(json.dumps(self._chunk("", done=True)) + "\n")
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up (e.g. its read timeout fired)
+            self.close_connection = True
+
+    def _write_chunk(self, text):
+        data = text.encode()
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def make_server(config, host='127.0.0.1', port=11435):
+    """Build a threaded fake Ollama server; call serve_forever() to run it"""
+    handler = type('ConfiguredFakeOllamaHandler', (FakeOllamaHandler,), {'config': config})
+    server = http.server.ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake Ollama server for load and latency testing')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=11435)
+    parser.add_argument('--model', default='llama3.2:3b', help='Model name reported by /api/tags')
+    parser.add_argument('--latency', default='fixed:0.5',
+                        help='Time-to-first-token distribution, e.g. lognormal:0.8,0.5')
+    parser.add_argument('--token-interval', type=float, default=0.02, help='Seconds between streamed tokens')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of generations that fail')
+    parser.add_argument('--error-status', type=int, default=500, help='HTTP status of failed generations')
+    parser.add_argument('--timeout-rate', type=float, default=0.0,
+                        help='Fraction of generations that hang without answering')
+    parser.add_argument('--hang-seconds', type=float, default=60.0, help='How long hanging requests hang')
+    parser.add_argument('--tags-latency', type=float, default=0.0, help='Delay before /api/tags answers')
+    parser.add_argument('--seed', type=int, default=42, help='Seed for latency and failure draws')
+    args = parser.parse_args()
+
+    config = FakeOllamaConfig(
+        model=args.model, latency=args.latency, token_interval=args.token_interval,
+        error_rate=args.error_rate, error_status=args.error_status, timeout_rate=args.timeout_rate,
+        hang_seconds=args.hang_seconds, tags_latency=args.tags_latency, seed=args.seed
+    )
+    server = make_server(config, args.host, args.port)
+    print(f"Fake Ollama serving {args.model} on http://{args.host}:{args.port} "
+          f"(latency {args.latency}, errors {args.error_rate:.0%}, timeouts {args.timeout_rate:.0%})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\nStats: {config.stats}")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Flattened-forest inference engine for RandomForestClassifier
+
+The trained forest is compiled into contiguous node arrays and every tree is
+walked at once with NumPy fancy indexing, one tree level per step. This avoids
+scikit-learn's per-call validation and per-estimator dispatch, and reproduces
+predict_proba exactly.
+
+Run this module to check parity against scikit-learn:
+    python forest_engine.py
+"""
+import sys
+import numpy as np
+
+
+def flatten_forest(forest):
+    """Concatenate every tree's node arrays, with child indices made global
+
+    The arrays are written in the layout FlatForest walks, so an artifact can
+    memory-map them and serve them without copying. Leaf values are stored as
+    class probabilities; trees pickled by older scikit-learn versions hold class
+    counts, which are normalized here.
+    """
+    offsets = [0]
+    children_left, children_right, feature, threshold, value = [], [], [], [], []
+
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+        offset = offsets[-1]
+        left = tree.children_left.astype(np.int64)
+        right = tree.children_right.astype(np.int64)
+        children_left.append(np.where(left == -1, -1, left + offset))
+        children_right.append(np.where(right == -1, -1, right + offset))
+        feature.append(tree.feature.astype(np.int64))
+        threshold.append(tree.threshold.astype(np.float64))
+
+        tree_value = tree.value[:, 0, :].astype(np.float64)
+        totals = tree_value.sum(axis=1, keepdims=True)
+        if not np.allclose(totals, 1.0):
+            totals[totals == 0] = 1.0
+            tree_value = tree_value / totals
+        value.append(tree_value)
+        offsets.append(offset + tree.node_count)
+
+    children, feature = engine_layout(np.concatenate(children_left), np.concatenate(children_right),
+                                      np.concatenate(feature))
+    return {
+        'tree_offsets': np.asarray(offsets, dtype=np.int64),
+        'children': children,
+        'feature': feature,
+        'threshold': np.concatenate(threshold),
+        'value': np.concatenate(value)
+    }
+
+
+def normalize_leaf_values(forest):
+    """Rewrite count-valued leaves of a pickled forest as class probabilities, in place
+
+    scikit-learn < 1.4 stored class counts in tree_.value and normalized them
+    inside predict_proba; newer versions store probabilities and return them
+    as they are. Loading an old pickle under a new version therefore yields
+    "probabilities" far above 1 unless the leaves are normalized first.
+    Returns the number of trees rewritten.
+    """
+    rewritten = 0
+    for estimator in forest.estimators_:
+        value = estimator.tree_.value
+        totals = value.sum(axis=2, keepdims=True)
+        if not np.allclose(totals, 1.0):
+            totals[totals == 0] = 1.0
+            value[...] = value / totals
+            rewritten += 1
+    return rewritten
+
+
+def engine_layout(children_left, children_right, feature):
+    """Build the (node, side) child table and leaf-safe feature indices
+
+    Leaves point back at themselves, so every row can take exactly max_depth
+    steps without checking which nodes are leaves; their feature index is 0
+    so the comparison they still make stays in bounds.
+    """
+    left = np.asarray(children_left, dtype=np.int64)
+    right = np.asarray(children_right, dtype=np.int64)
+    is_leaf = left == -1
+    node_ids = np.arange(len(left))
+    children = np.column_stack([
+        np.where(is_leaf, node_ids, left),
+        np.where(is_leaf, node_ids, right)
+    ])
+    return children, np.where(is_leaf, 0, feature).astype(np.int64)
+
+
+class FlatForest:
+    """Random forest evaluated from flattened node arrays, all trees per step"""
+
+    def __init__(self, arrays, classes, block_size=4096):
+        self.classes_ = np.asarray(classes)
+        self.block_size = block_size
+        self.roots = np.asarray(arrays['tree_offsets'][:-1], dtype=np.int64)
+        self.n_trees = len(self.roots)
+        self.threshold = arrays['threshold']
+        self.value = arrays['value']
+        self.children = arrays['children']
+        self.feature = arrays['feature']
+        is_leaf = self.children[:, 0] == np.arange(len(self.children))
+        self.max_depth = self._max_depth(is_leaf)
+
+    @classmethod
+    def from_sklearn(cls, forest, **kwargs):
+        """Compile a fitted RandomForestClassifier"""
+        return cls(flatten_forest(forest), forest.classes_, **kwargs)
+
+    def _max_depth(self, is_leaf):
+        """Number of levels below the deepest root-to-leaf path"""
+        depth = 0
+        frontier = self.roots[~is_leaf[self.roots]]
+        while len(frontier):
+            depth += 1
+            frontier = self.children[frontier].ravel()
+            frontier = frontier[~is_leaf[frontier]]
+        return depth
+
+    def predict_proba(self, X):
+        # scikit-learn compares float32 features against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+
+        proba = np.empty((X.shape[0], len(self.classes_)))
+        for start in range(0, X.shape[0], self.block_size):
+            block = X[start:start + self.block_size]
+            proba[start:start + len(block)] = self._predict_block(block)
+        return proba
+
+    def _predict_block(self, X):
+        rows = np.arange(X.shape[0])[:, None]
+        node = np.broadcast_to(self.roots, (X.shape[0], self.n_trees))
+        for _ in range(self.max_depth):
+            go_right = X[rows, self.feature[node]] > self.threshold[node]
+            node = self.children[node, go_right.astype(np.int64)]
+
+        # Sum trees in order along the leading axis, matching scikit-learn's accumulation
+        leaf_values = self.value[node.T]
+        return leaf_values.sum(axis=0) / self.n_trees
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+def verify_parity(forest, X):
+    """Compare FlatForest against forest.predict_proba; returns the max absolute difference"""
+    expected = forest.predict_proba(X)
+    actual = FlatForest.from_sklearn(forest).predict_proba(X)
+    return float(np.abs(expected - actual).max())
+
+
+if __name__ == "__main__":
+    import time
+    from sklearn.datasets import make_classification
+    from sklearn.ensemble import RandomForestClassifier
+
+    # Parity on a freshly trained forest with the production hyperparameters
+    X, y = make_classification(n_samples=2000, n_features=21, random_state=0)
+    forest = RandomForestClassifier(n_estimators=200, max_depth=15, min_samples_split=3,
+                                    min_samples_leaf=2, class_weight='balanced', random_state=42)
+    forest.fit(X[:1500], y[:1500])
+    diff = verify_parity(forest, X[1500:])
+    print(f"Synthetic forest: max |difference| = {diff}")
+
+    engine = FlatForest.from_sklearn(forest)
+    row = X[1500:1501]
+    start = time.perf_counter()
+    for _ in range(1000):
+        engine.predict_proba(row)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    print(f"Single-row latency: {elapsed_ms / 1000:.3f} ms")
+
+    if diff != 0.0:
+        sys.exit(1)
@@ -0,0 +1,25 @@
+from flask import jsonify
+
+def register_health_endpoints(app, model, env_index=None, batcher=None):
+    """Add /healthz (liveness) and /readyz (readiness) routes to a Flask app"""
+    
+    @app.route('/healthz', methods=['GET'])
+    def healthz():
+        # The process is up and serving requests
+        return jsonify({'status': 'ok'})
+    
+    @app.route('/readyz', methods=['GET'])
+    def readyz():
+        # Only route traffic here once the model and environmental data are loaded
+        checks = {
+            'model_loaded': model.model is not None,
+            'environment_data_loaded': env_index is None or len(env_index.boroughs()) > 0
+        }
+        ready = all(checks.values())
+        body = {'ready': ready, 'checks': checks}
+        cache_stats = model.get_cache_stats() if hasattr(model, 'get_cache_stats') else None
+        if cache_stats is not None:
+            body['prediction_cache'] = cache_stats
+        if batcher is not None:
+            body['micro_batcher'] = batcher.stats()
+        return jsonify(body), 200 if ready else 503
@@ -1,17 +1,42 @@
 #!/usr/bin/env python3
 """
-Hybrid server that runs Flask backend on one port and serves frontend on another
-This approach ensures the interface works while providing full backend functionality
+Hybrid server for the CVD assessment interface
+
+Two modes are available:
+    inproc  (default) one threaded server on port 8080 serves the page and the API
+    proxy   a threaded frontend on port 8080 serves static files and forwards API
+            calls to the Flask backend on port 5001 over pooled keep-alive connections
+
+    python hybrid_server.py [--mode inproc|proxy]
+
+The built-in Werkzeug backend closes every connection. For keep-alive, serve the
+backend with serve.py and point the proxy at it:
+    python serve.py --app hybrid_server --bind 127.0.0.1:5001 &
+    python hybrid_server.py --mode proxy --backend 127.0.0.1:5001
+    python hybrid_server.py --compare 200    # latency comparison of the designs
 """
 import threading
 import time
+import json
+import argparse
 import webbrowser
+import http.client
 import http.server
 import socketserver
 import os
-from flask import Flask, render_template, request, jsonify
-import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, render_template, request, jsonify, Response
 from ml_model import CVDRiskModel
+from environment_index import BoroughEnvironmentIndex
+from health_checks import register_health_endpoints
+from micro_batcher import MicroBatchScorer
+from instrumentation import span, register_metrics, BREAKDOWN_HEADER
+from batch_assessment import register_batch_endpoint
+from what_if import register_what_if_endpoint
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_ADDRESS = ('127.0.0.1', 5001)
+FRONTEND_PORT = 8080
 
 # Flask backend setup
 app = Flask(__name__)
@@ -21,9 +46,19 @@ model = CVDRiskModel()
 if not model.load_model():
     print("Warning: Model not found. Please train the model first.")
 
+# Optionally coalesce concurrent predictions into batches (CVD_MICROBATCH=1)
+batcher = MicroBatchScorer.from_env(model)
+scorer = batcher or model
+
+# Borough environmental data, loaded once and reloaded when the CSV changes
+env_index = BoroughEnvironmentIndex()
+register_health_endpoints(app, model, env_index, batcher)
+register_metrics(app)
+
 # Try to import LLM advisor
 try:
     from llm_advisor import CVDLlamaAdvisor
+    from advice_jobs import AdviceJobManager, format_sse
     LLM_AVAILABLE = True
     print("✓ LLM advisor imported successfully")
 except Exception as e:
@@ -35,6 +70,7 @@ ollama_status = False
 if LLM_AVAILABLE:
     try:
         llm_advisor = CVDLlamaAdvisor()
+        advice_jobs = AdviceJobManager(llm_advisor)
         ollama_status = llm_advisor.check_ollama_availability()
         if ollama_status:
             print("✓ Ollama connected successfully")
@@ -44,49 +80,46 @@ if LLM_AVAILABLE:
         print(f"⚠ LLM advisor failed: {e}")
         LLM_AVAILABLE = False
 
+# Bulk scoring for clinic uploads; advice is queued or rule-based, never awaited
+register_batch_endpoint(app, model, env_index,
+                        llm_advisor if LLM_AVAILABLE else None,
+                        advice_jobs if LLM_AVAILABLE else None)
+register_what_if_endpoint(app, model, env_index)
+
+@app.route('/')
+def index():
+    return render_template('index.html')
+
 @app.route('/assess_risk', methods=['POST'])
 def assess_risk():
     try:
         # Get form data
-        user_data = {
-            'Age': int(request.form['age']),
-            'Gender': request.form['gender'],
-            'Smoker': request.form['smoker'],
-            'FamilyHistoryCVD': request.form['family_history'],
-            'Diabetes': request.form['diabetes'],
-            'HighBloodPressure': request.form['high_bp'],
-            'PhysicalActivityLevel': request.form['activity'],
-            'BMI': float(request.form['bmi']),
-            'TotalCholesterol': float(request.form['cholesterol']),
-            'SystolicBP': float(request.form['systolic_bp']),
-            'DiastolicBP': float(request.form['diastolic_bp']),
-            'AlcoholConsumption': request.form['alcohol'],
-            'StressLevel': request.form['stress'],
-            'SleepHours': float(request.form['sleep_hours']),
-            'Borough': request.form['borough']
-        }
+        with span('parse_form'):
+            user_data = {
+                'Age': int(request.form['age']),
+                'Gender': request.form['gender'],
+                'Smoker': request.form['smoker'],
+                'FamilyHistoryCVD': request.form['family_history'],
+                'Diabetes': request.form['diabetes'],
+                'HighBloodPressure': request.form['high_bp'],
+                'PhysicalActivityLevel': request.form['activity'],
+                'BMI': float(request.form['bmi']),
+                'TotalCholesterol': float(request.form['cholesterol']),
+                'SystolicBP': float(request.form['systolic_bp']),
+                'DiastolicBP': float(request.form['diastolic_bp']),
+                'AlcoholConsumption': request.form['alcohol'],
+                'StressLevel': request.form['stress'],
+                'SleepHours': float(request.form['sleep_hours']),
+                'Borough': request.form['borough']
+            }
         
-        # Load environmental data
-        env_data = pd.read_csv('../environmental_data/expanded_environmental_data.csv')
-        borough_env = env_data[env_data['Borough'] == user_data['Borough']]
-        
-        if not borough_env.empty:
-            user_data['Avg_PM25'] = borough_env['Avg_PM25'].iloc[0]
-            user_data['Avg_NO2'] = borough_env['Avg_NO2'].iloc[0]
-            user_data['NoiseLevel_dB'] = borough_env['NoiseLevel_dB'].iloc[0]
-            user_data['GreenSpacePercent'] = borough_env['GreenSpacePercent'].iloc[0]
-            user_data['WalkabilityScore'] = borough_env['WalkabilityScore'].iloc[0]
-            user_data['UrbanHeatIncrease'] = borough_env['UrbanHeatIncrease'].iloc[0]
-        else:
-            user_data['Avg_PM25'] = env_data['Avg_PM25'].mean()
-            user_data['Avg_NO2'] = env_data['Avg_NO2'].mean()
-            user_data['NoiseLevel_dB'] = env_data['NoiseLevel_dB'].mean()
-            user_data['GreenSpacePercent'] = env_data['GreenSpacePercent'].mean()
-            user_data['WalkabilityScore'] = env_data['WalkabilityScore'].mean()
-            user_data['UrbanHeatIncrease'] = env_data['UrbanHeatIncrease'].mean()
+        # Join environmental data for the borough
+        with span('env_join'):
+            env_index.apply(user_data)
         
         # Make prediction
-        result = model.predict_risk(user_data)
+        with span('predict'):
+            result = scorer.predict_risk(user_data)
         
         # Add environmental data
         result['environmental_data'] = {
@@ -98,26 +131,31 @@ def assess_risk():
         # Add recommendations
         result['recommendations'] = get_recommendations(result['risk_level'])
         
-        # Generate advice
-        if LLM_AVAILABLE and ollama_status:
-            try:
-                llm_advice = llm_advisor.get_environmental_advice(
-                    result['risk_level'], result['environmental_data'], user_data)
-                result['llm_advice'] = llm_advice
-                result['llm_available'] = True
-                print(f"✓ Generated Ollama advice for {result['risk_level']} risk")
-            except Exception as e:
-                print(f"⚠ Ollama failed: {e}")
+        # Generate advice in the background; fetched from /advice/<job_id>
+        with span('advice'):
+            if LLM_AVAILABLE and llm_advisor.is_available():
+                try:
+                    job = advice_jobs.submit(
+                        result['risk_level'], result['environmental_data'], user_data)
+                    job_state = job.snapshot()
+                    result['advice_job_id'] = job.id
+                    result['llm_pending'] = job_state['status'] != 'done'
+                    result['llm_advice'] = job_state['llm_advice']
+                    result['llm_available'] = True
+                except Exception as e:
+                    print(f"⚠ Ollama failed: {e}")
+                    result['llm_advice'] = get_fallback_advice(result['risk_level'], user_data['Borough'])
+                    result['llm_available'] = False
+            else:
                 result['llm_advice'] = get_fallback_advice(result['risk_level'], user_data['Borough'])
                 result['llm_available'] = False
-        else:
-            result['llm_advice'] = get_fallback_advice(result['risk_level'], user_data['Borough'])
-            result['llm_available'] = False
         
-        return jsonify({
-            'success': True,
-            'result': result
-        })
+        with span('serialize'):
+            response = jsonify({
+                'success': True,
+                'result': result
+            })
+        return response
         
     except Exception as e:
         return jsonify({
@@ -125,6 +163,31 @@ def assess_risk():
             'error': str(e)
         }), 400
 
+@app.route('/advice/<job_id>', methods=['GET'])
+def advice_status(job_id):
+    job = advice_jobs.get(job_id) if LLM_AVAILABLE else None
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': 'Unknown advice job'
+        }), 404
+    return jsonify({
+        'success': True,
+        'result': job.snapshot()
+    })
+
+@app.route('/advice/<job_id>/stream', methods=['GET'])
+def advice_stream(job_id):
+    job = advice_jobs.get(job_id) if LLM_AVAILABLE else None
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': 'Unknown advice job'
+        }), 404
+    events = (format_sse(event) for event in advice_jobs.iter_events(job))
+    return Response(events, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 def get_recommendations(risk_level):
     recommendations = {
         'Low Risk': [
@@ -169,60 +232,120 @@ def get_fallback_advice(risk_level, borough):
     
     return f"{risk_tip} {borough_tip}"
 
-# Frontend server class
+# Frontend server classes
+class ThreadingFrontendServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """Frontend server that handles each connection on its own thread"""
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+class BackendPool:
+    """Keep-alive HTTP connections to the Flask backend, shared by frontend threads"""
+
+    def __init__(self, address, max_idle=16, timeout=30):
+        self.address = address
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return http.client.HTTPConnection(*self.address, timeout=self.timeout)
+
+    def release(self, conn, response):
+        # A connection can only be reused once its last response was read to the end,
+        # and only if the backend keeps connections alive (Werkzeug's dev server does not)
+        with self._lock:
+            if response.isclosed() and not response.will_close and len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
 class FrontendHandler(http.server.SimpleHTTPRequestHandler):
+    backend = BackendPool(BACKEND_ADDRESS)
+    proxied_paths = ('/healthz', '/readyz', '/metrics')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, directory=APP_DIR, **kwargs)
+
     def do_GET(self):
+        if self.path.startswith('/advice/') or self.path in self.proxied_paths:
+            return self._proxy('GET')
         if self.path == '/' or self.path == '/index.html':
             self.path = '/templates/index.html'
         return super().do_GET()
-    
+
     def do_POST(self):
-        # Proxy POST requests to Flask backend
-        import urllib.request
-        import urllib.parse
-        import json
-        
-        if self.path == '/assess_risk':
+        if self.path == '/assess_risk' or self.path.startswith('/assess_risk/'):
+            return self._proxy('POST')
+        self.send_error(501, "Unsupported method ('POST')")
+
+    def _send_to_backend(self, method, body, headers):
+        # A pooled connection may have been closed by the backend while idle,
+        # so a failed send is retried once on a fresh connection
+        for attempt in range(2):
+            conn = self.backend.acquire()
             try:
-                # Get form data
-                content_length = int(self.headers['Content-Length'])
-                post_data = self.rfile.read(content_length)
-                print(f"Proxying request to backend: {len(post_data)} bytes")
-                
-                # Forward to Flask backend
-                req = urllib.request.Request(
-                    'http://127.0.0.1:5001/assess_risk',
-                    data=post_data,
-                    headers={'Content-Type': 'application/x-www-form-urlencoded'}
-                )
-                
-                with urllib.request.urlopen(req, timeout=30) as response:
-                    result = response.read()
-                    print(f"Backend responded: {response.status}")
-                
-                # Send response back
-                self.send_response(200)
-                self.send_header('Content-Type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.send_header('Access-Control-Allow-Methods', 'POST, OPTIONS')
-                self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-                self.end_headers()
-                self.wfile.write(result)
-                
-            except Exception as e:
-                print(f"⚠ Backend request failed: {e}")
-                self.send_response(200)  # Send 200 to avoid browser errors
-                self.send_header('Content-Type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
+                conn.request(method, self.path, body=body, headers=headers)
+                return conn, conn.getresponse()
+            except (http.client.HTTPException, ConnectionError):
+                conn.close()
+                if attempt:
+                    raise
+
+    def _proxy(self, method):
+        # Relay API calls, advice polls and event streams from the Flask backend as they arrive
+        body = None
+        headers = {}
+        # Ask the backend for its stage timings when the client did
+        if self.headers.get(BREAKDOWN_HEADER):
+            headers[BREAKDOWN_HEADER] = self.headers[BREAKDOWN_HEADER]
+        if method == 'POST':
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            headers['Content-Type'] = self.headers.get('Content-Type', 'application/x-www-form-urlencoded')
+
+        try:
+            conn, response = self._send_to_backend(method, body, headers)
+        except Exception as e:
+            print(f"⚠ Backend request failed: {e}")
+            if method == 'POST':
+                # Send 200 with an error body to avoid browser errors
                 error_response = json.dumps({
-                    "success": False, 
+                    "success": False,
                     "error": f"Backend connection failed: {str(e)}"
-                })
-                self.wfile.write(error_response.encode())
-        else:
-            super().do_POST()
-    
+                }).encode()
+                self._relay(200, 'application/json', [error_response])
+            else:
+                self.send_response(502)
+                self.end_headers()
+            return
+
+        try:
+            server_timing = response.getheader('Server-Timing')
+            self._relay(response.status, response.getheader('Content-Type', 'application/json'),
+                        iter(lambda: response.read1(4096), b''),
+                        {'Server-Timing': server_timing} if server_timing else None)
+            response.read()
+        finally:
+            self.backend.release(conn, response)
+
+    def _relay(self, status, content_type, chunks, extra_headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        for name, value in (extra_headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'POST, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.end_headers()
+        for chunk in chunks:
+            self.wfile.write(chunk)
+            self.wfile.flush()
+
     def do_OPTIONS(self):
         # Handle preflight requests
         self.send_response(200)
@@ -235,47 +358,167 @@ def run_flask_backend():
     """Run Flask backend on port 5001"""
     try:
         print("🔧 Starting Flask backend on port 5001...")
-        app.run(host='127.0.0.1', port=5001, debug=False, use_reloader=False)
+        app.run(host=BACKEND_ADDRESS[0], port=BACKEND_ADDRESS[1], debug=False, use_reloader=False, threaded=True)
     except Exception as e:
         print(f"⚠ Flask backend failed: {e}")
 
 def run_frontend_server():
-    """Run frontend server on port 8080"""
+    """Run the threaded proxying frontend server on port 8080"""
     try:
-        os.chdir('/Users/mirceaserban/Desktop/Cardio_project_test1/app_code')
-        with socketserver.TCPServer(("", 8080), FrontendHandler) as httpd:
-            print("🌐 Frontend server running on http://localhost:8080")
+        with ThreadingFrontendServer(("", FRONTEND_PORT), FrontendHandler) as httpd:
+            print(f"🌐 Frontend server running on http://localhost:{FRONTEND_PORT}")
             httpd.serve_forever()
     except Exception as e:
         print(f"⚠ Frontend server failed: {e}")
 
+def run_inproc_server():
+    """Serve the interface and the API from one threaded Flask server on port 8080"""
+    try:
+        print(f"🌐 Server running on http://localhost:{FRONTEND_PORT}")
+        app.run(host='0.0.0.0', port=FRONTEND_PORT, debug=False, use_reloader=False, threaded=True)
+    except Exception as e:
+        print(f"⚠ Server failed: {e}")
+
 def open_browser():
     """Open browser after servers start"""
     time.sleep(3)
-    webbrowser.open('http://localhost:8080')
+    webbrowser.open(f'http://localhost:{FRONTEND_PORT}')
+
+# Latency comparison of the serving designs
+SAMPLE_FORM = (
+    'age=55&gender=Male&smoker=Yes&family_history=Yes&diabetes=No&high_bp=Yes'
+    '&activity=Low&bmi=29.5&cholesterol=240&systolic_bp=145&diastolic_bp=92'
+    '&alcohol=Moderate&stress=High&sleep_hours=6&borough=Tower+Hamlets'
+)
+
+def _timed_request(port, method, path, body=None):
+    # Each request opens its own client connection, like separate browsers
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    start = time.perf_counter()
+    headers = {'Content-Type': 'application/x-www-form-urlencoded'} if body else {}
+    try:
+        conn.request(method, path, body=body, headers=headers)
+        response = conn.getresponse()
+        response.read()
+    except (http.client.HTTPException, ConnectionError):
+        return None
+    finally:
+        conn.close()
+    return (time.perf_counter() - start) * 1000
+
+def _start_server(server):
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+def compare_latency(num_requests=200, concurrency=8):
+    """
+    Time a concurrent mix of page loads and /assess_risk calls against the
+    single-threaded proxy (a new backend connection per call), the threaded
+    pooled proxy and the in-process server. Returns {design: stats}.
+    """
+    import logging
+    from werkzeug.serving import make_server
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    backend = _start_server(make_server('127.0.0.1', 0, app, threaded=True))
+    backend_address = ('127.0.0.1', backend.server_port)
+
+    def quiet_handler(pool):
+        return type('QuietFrontendHandler', (FrontendHandler,), {
+            'backend': pool,
+            'log_message': lambda self, *args: None
+        })
+
+    designs = [
+        ('single-threaded proxy', socketserver.TCPServer(
+            ('127.0.0.1', 0), quiet_handler(BackendPool(backend_address, max_idle=0)))),
+        ('threaded pooled proxy', ThreadingFrontendServer(
+            ('127.0.0.1', 0), quiet_handler(BackendPool(backend_address)))),
+        ('in-process', backend)
+    ]
+    workload = [('POST', '/assess_risk', SAMPLE_FORM) if i % 2 == 0 else ('GET', '/', None)
+                for i in range(num_requests)]
+
+    results = {}
+    for name, server in designs:
+        if server is not backend:
+            _start_server(server)
+        port = server.server_address[1]
+        _timed_request(port, 'POST', '/assess_risk', SAMPLE_FORM)  # warm up
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            timings = list(executor.map(lambda item: _timed_request(port, *item), workload))
+        elapsed = time.perf_counter() - start
+        server.shutdown()
+        if server is not backend:
+            server.server_close()
+
+        latencies = sorted(t for t in timings if t is not None)
+        results[name] = {
+            'errors': len(timings) - len(latencies),
+            'mean_ms': round(sum(latencies) / len(latencies), 2),
+            'p50_ms': round(latencies[len(latencies) // 2], 2),
+            'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1], 2),
+            'max_ms': round(latencies[-1], 2),
+            'requests_per_s': round(num_requests / elapsed, 1)
+        }
+        print(f"{name:<24} mean {results[name]['mean_ms']:>8.2f} ms   p50 {results[name]['p50_ms']:>8.2f} ms   "
+              f"p95 {results[name]['p95_ms']:>8.2f} ms   "
+              f"max {results[name]['max_ms']:>8.2f} ms   "
+              f"{results[name]['requests_per_s']:>7.1f} req/s   "
+              f"{results[name]['errors']} errors")
+
+    backend.server_close()
+    return results
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='CVD assessment hybrid server')
+    parser.add_argument('--mode', choices=['inproc', 'proxy'], default='inproc',
+                        help='inproc: one server for page and API; proxy: frontend forwarding to the Flask backend')
+    parser.add_argument('--backend', metavar='HOST:PORT',
+                        help='Proxy to an already running backend instead of starting one')
+    parser.add_argument('--compare', type=int, metavar='N',
+                        help='Compare serving designs with N concurrent requests and exit')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent clients for --compare')
+    args = parser.parse_args()
+
+    if args.backend:
+        host, _, port = args.backend.rpartition(':')
+        BACKEND_ADDRESS = (host or '127.0.0.1', int(port))
+        FrontendHandler.backend = BackendPool(BACKEND_ADDRESS)
+
+    if args.compare:
+        compare_latency(args.compare, args.concurrency)
+        raise SystemExit(0)
+
     print("\n🫀 CVD Assessment with Hybrid Server Architecture")
     print("=" * 55)
     print(f"✓ ML Model: {'Loaded' if model.model else 'Not Found'}")
     print(f"✓ LLM Available: {LLM_AVAILABLE}")
     print(f"✓ Ollama Connected: {ollama_status}")
     print("=" * 55)
-    print("🚀 Starting servers:")
-    print("   • Frontend: http://localhost:8080")
-    print("   • Backend: http://127.0.0.1:5001")
+    print(f"🚀 Starting servers ({args.mode} mode):")
+    print(f"   • Frontend: http://localhost:{FRONTEND_PORT}")
+    if args.mode == 'proxy':
+        print(f"   • Backend: http://{BACKEND_ADDRESS[0]}:{BACKEND_ADDRESS[1]}")
     print("=" * 55)
-    
-    # Start Flask backend in thread
-    backend_thread = threading.Thread(target=run_flask_backend, daemon=True)
-    backend_thread.start()
-    
+
+    if args.mode == 'proxy' and not args.backend:
+        # Start Flask backend in thread
+        backend_thread = threading.Thread(target=run_flask_backend, daemon=True)
+        backend_thread.start()
+
     # Start browser opener in thread
     browser_thread = threading.Thread(target=open_browser, daemon=True)
     browser_thread.start()
-    
-    # Run frontend server in main thread
+
+    # Run the frontend server in main thread
     try:
-        run_frontend_server()
+        if args.mode == 'proxy':
+            run_frontend_server()
+        else:
+            run_inproc_server()
     except KeyboardInterrupt:
-        print("\n✓ Servers stopped")
\ No newline at end of file
+        print("\n✓ Servers stopped")
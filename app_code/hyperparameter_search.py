@@ -0,0 +1,172 @@
+import json
+import time
+import numpy as np
+from scipy.stats import loguniform
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401 (enables the import below)
+from sklearn.model_selection import HalvingRandomSearchCV, StratifiedKFold
+from ml_model import CVDRiskModel, DEFAULT_MODEL_PARAMS, evaluate_model
+from training_orchestrator import TrainingOrchestrator
+
+# Distributions sampled per model family; fixed settings come from DEFAULT_MODEL_PARAMS
+SEARCH_SPACES = {
+    'random_forest': {
+        'n_estimators': [25, 50, 100, 200, 400],
+        'max_depth': [6, 8, 10, 15, 20, None],
+        'min_samples_split': [2, 3, 5, 10],
+        'min_samples_leaf': [1, 2, 4],
+        'max_features': ['sqrt', 'log2', 0.5]
+    },
+    'logistic_regression': {
+        'C': loguniform(1e-3, 1e2)
+    }
+}
+
+# Random candidates drawn per family for the first halving round
+DEFAULT_CANDIDATE_COUNTS = {'random_forest': 60, 'logistic_regression': 20}
+
+# Without an explicit bar, candidates within this much of the best CV score qualify
+ACCURACY_TOLERANCE = 0.01
+
+class HyperparameterSearch:
+    """Successive-halving search over both model families, selecting on accuracy then latency
+
+    The training data is loaded and preprocessed once and shared by every
+    search. Each family runs HalvingRandomSearchCV across all cores, with the
+    last round using (nearly) all records. The candidates that survive to the
+    final round are cross-validated again on the full data with the same folds,
+    so both families are compared on equal terms, then refitted and timed on
+    single-row and batch predictions. The winner is the fastest single-row
+    model whose full-data CV score meets the accuracy bar.
+    """
+
+    def __init__(self, candidate_counts=None, cv=5, factor=3, min_accuracy=None,
+                 finalists=3, latency_rows=300, n_jobs=-1, random_state=42, streaming=False):
+        self.candidate_counts = candidate_counts or DEFAULT_CANDIDATE_COUNTS
+        self.cv = cv
+        self.factor = factor
+        self.min_accuracy = min_accuracy
+        self.finalists = finalists
+        self.latency_rows = latency_rows
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+        self.orchestrator = TrainingOrchestrator(cv=cv, random_state=random_state, streaming=streaming)
+
+    def search_family(self, model_type, X, y):
+        """Run successive halving for one family; return its final-round candidates"""
+        base = CVDRiskModel(model_type=model_type)
+        base.create_model()
+        search = HalvingRandomSearchCV(
+            base.model,
+            SEARCH_SPACES[model_type],
+            n_candidates=self.candidate_counts[model_type],
+            factor=self.factor,
+            min_resources='exhaust',
+            cv=StratifiedKFold(n_splits=self.cv, shuffle=True, random_state=self.random_state),
+            scoring='accuracy',
+            refit=False,
+            n_jobs=self.n_jobs,
+            random_state=self.random_state
+        )
+        start = time.perf_counter()
+        search.fit(X, y)
+        seconds = time.perf_counter() - start
+
+        results = search.cv_results_
+        final_round = np.flatnonzero(results['iter'] == results['iter'].max())
+        ranked = final_round[np.argsort(-results['mean_test_score'][final_round])][:self.finalists]
+        print(f"{model_type.replace('_', ' ').title()}: {len(results['params'])} fits over "
+              f"{search.n_iterations_} rounds in {seconds:.2f}s")
+        return [{
+            'model_type': model_type,
+            'model_params': {key: _to_json(value) for key, value in results['params'][i].items()},
+            'search_score': float(results['mean_test_score'][i]),
+            'n_resources': int(results['n_resources'][i])
+        } for i in ranked]
+
+    def measure_latency(self, candidate, X, y):
+        """Cross-validate a candidate on the full data, fit it and time its predictions
+
+        Returns the fitted model.
+        """
+        model = CVDRiskModel(model_type=candidate['model_type'], model_params=candidate['model_params'])
+        model.create_model()
+        model.data_processor = self.orchestrator.data_processor
+
+        evaluation = evaluate_model(model.model, X, y, cv=self.cv, n_jobs=self.n_jobs,
+                                    random_state=self.random_state)
+        candidate['cv_mean'] = float(evaluation['cv_scores'].mean())
+        candidate['cv_std'] = float(evaluation['cv_scores'].std())
+        candidate['accuracy'] = evaluation['accuracy']
+
+        start = time.perf_counter()
+        model.model.fit(X, y)
+        candidate['fit_seconds'] = time.perf_counter() - start
+
+        rng = np.random.default_rng(self.random_state)
+        rows = np.asarray(X[rng.integers(0, len(X), self.latency_rows)], dtype=np.float64)
+        for row in rows[:5]:
+            model.predict_risk_rows(row.reshape(1, -1))
+        latencies = []
+        for row in rows:
+            row_start = time.perf_counter()
+            model.predict_risk_rows(row.reshape(1, -1))
+            latencies.append(time.perf_counter() - row_start)
+        candidate['latency_p50_ms'] = float(np.percentile(latencies, 50)) * 1000
+        candidate['latency_p95_ms'] = float(np.percentile(latencies, 95)) * 1000
+
+        batch_start = time.perf_counter()
+        model.predict_risk_rows(np.asarray(X, dtype=np.float64))
+        candidate['batch_rows_per_s'] = len(X) / (time.perf_counter() - batch_start)
+        return model
+
+    def run(self, leaderboard_path='search_leaderboard.json'):
+        """Search every family and return (selected CVDRiskModel, leaderboard entries)"""
+        load_start = time.perf_counter()
+        X, y = self.orchestrator.load_data()
+        print(f"Loaded and preprocessed {len(y)} records in {time.perf_counter() - load_start:.2f}s")
+
+        leaderboard = []
+        for model_type in self.candidate_counts:
+            leaderboard.extend(self.search_family(model_type, X, y))
+
+        models = [self.measure_latency(entry, X, y) for entry in leaderboard]
+
+        bar = self.min_accuracy
+        if bar is None:
+            bar = max(entry['cv_mean'] for entry in leaderboard) - ACCURACY_TOLERANCE
+        for entry in leaderboard:
+            entry['meets_accuracy_bar'] = entry['cv_mean'] >= bar
+
+        # Fastest qualifying model; if none qualifies, the most accurate one
+        qualifying = [i for i, entry in enumerate(leaderboard) if entry['meets_accuracy_bar']]
+        if qualifying:
+            selected = min(qualifying, key=lambda i: leaderboard[i]['latency_p50_ms'])
+        else:
+            selected = max(range(len(leaderboard)), key=lambda i: leaderboard[i]['cv_mean'])
+        for i, entry in enumerate(leaderboard):
+            entry['selected'] = i == selected
+
+        best_model = models[selected]
+        best_model.model_params = leaderboard[selected]['model_params']
+        best_model.reference_accuracy = leaderboard[selected]['accuracy']
+
+        order = sorted(range(len(leaderboard)),
+                       key=lambda i: (not leaderboard[i]['meets_accuracy_bar'], leaderboard[i]['latency_p50_ms']))
+        leaderboard = [leaderboard[i] for i in order]
+        report = {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'records': int(len(y)),
+            'cv': self.cv,
+            'factor': self.factor,
+            'accuracy_bar': bar,
+            'fixed_params': DEFAULT_MODEL_PARAMS,
+            'leaderboard': leaderboard
+        }
+        with open(leaderboard_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, default=_to_json)
+        print(f"Leaderboard written to {leaderboard_path}")
+        return best_model, leaderboard
+
+def _to_json(value):
+    """NumPy scalars from sampled distributions as plain Python values"""
+    return value.item() if isinstance(value, np.generic) else value
@@ -0,0 +1,171 @@
+"""
+Lightweight per-stage timing for the assessment request path
+
+Code wraps each stage in a span:
+
+    with span('predict'):
+        result = model.predict_risk(user_data)
+
+With CVD_METRICS=1, span durations feed Prometheus histograms served at /metrics.
+Separately, any request sent with an "X-Timing-Breakdown: 1" header gets its
+own stage timings back in a Server-Timing response header. When neither is
+active, span() returns a shared no-op context manager.
+
+Metrics are kept per process; under gunicorn each worker reports its own.
+"""
+import os
+import time
+import bisect
+import threading
+from contextlib import nullcontext
+from typing import Dict, List, Optional, Tuple
+
+# Histogram bucket upper bounds in seconds, from sub-millisecond model calls to LLM generations
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+BREAKDOWN_HEADER = 'X-Timing-Breakdown'
+
+_NOOP = nullcontext()
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Histograms keyed by (metric name, label name, label value)"""
+
+    HELP = {
+        'cvd_stage_duration_seconds': 'Time spent in each stage of risk assessment',
+        'cvd_request_duration_seconds': 'Time spent handling each HTTP endpoint'
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, str, str], Histogram] = {}
+
+    def observe(self, metric: str, label: str, value: str, seconds: float):
+        key = (metric, label, value)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def render(self) -> str:
+        """Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            for metric in sorted({key[0] for key in self._histograms}):
+                lines.append(f"# HELP {metric} {self.HELP.get(metric, metric)}")
+                lines.append(f"# TYPE {metric} histogram")
+                for (name, label, value), histogram in sorted(self._histograms.items()):
+                    if name != metric:
+                        continue
+                    labels = f'{label}="{value}"'
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                    lines.append(f'{metric}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                    lines.append(f'{metric}_sum{{{labels}}} {histogram.sum}')
+                    lines.append(f'{metric}_count{{{labels}}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+class _RequestState(threading.local):
+    # Stage timings for the current request when a breakdown was asked for
+    breakdown: Optional[List[Tuple[str, float]]] = None
+
+
+registry = MetricsRegistry()
+_enabled = os.environ.get('CVD_METRICS', '').lower() in ('1', 'true', 'yes')
+_request = _RequestState()
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def set_enabled(enabled: bool):
+    """Turn histogram collection on or off at runtime"""
+    global _enabled
+    _enabled = enabled
+
+
+class _Span:
+    __slots__ = ('stage', 'start')
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+def span(stage: str):
+    """Time a block as the given stage; a shared no-op when nothing is collecting"""
+    if not _enabled and _request.breakdown is None:
+        return _NOOP
+    return _Span(stage)
+
+
+def observe(stage: str, seconds: float):
+    """Record a stage duration measured by the caller"""
+    if _enabled:
+        registry.observe('cvd_stage_duration_seconds', 'stage', stage, seconds)
+    breakdown = _request.breakdown
+    if breakdown is not None:
+        breakdown.append((stage, seconds))
+
+
+def register_metrics(app):
+    """Add /metrics and the per-request timing hooks to a Flask app"""
+    from flask import Response, g, request
+
+    @app.before_request
+    def start_request_timing():
+        g.request_start = time.perf_counter()
+        wants_breakdown = request.headers.get(BREAKDOWN_HEADER, '').lower() in ('1', 'true', 'yes')
+        _request.breakdown = [] if wants_breakdown else None
+
+    @app.after_request
+    def finish_request_timing(response):
+        elapsed = time.perf_counter() - g.get('request_start', time.perf_counter())
+        if _enabled:
+            registry.observe('cvd_request_duration_seconds', 'endpoint',
+                             request.endpoint or 'unmatched', elapsed)
+
+        breakdown = _request.breakdown
+        if breakdown is not None:
+            timings = [f"{stage};dur={seconds * 1000:.3f}" for stage, seconds in breakdown]
+            timings.append(f"total;dur={elapsed * 1000:.3f}")
+            response.headers['Server-Timing'] = ", ".join(timings)
+            _request.breakdown = None
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        body = registry.render() if _enabled else "# Metrics disabled; set CVD_METRICS=1 to enable\n"
+        return Response(body, mimetype='text/plain; version=0.0.4')
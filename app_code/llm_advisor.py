@@ -1,39 +1,239 @@
+import os
+import time
+import threading
 import requests
 import json
 import logging
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Iterator, Tuple
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from advice_cache import AdviceCache
+from circuit_breaker import CircuitBreaker
+from instrumentation import span, observe
+
+# Overridable per instance or with the OLLAMA_URL / OLLAMA_MODEL / OLLAMA_TIMEOUT environment variables
+DEFAULT_OLLAMA_URL = "http://localhost:11434"
+DEFAULT_OLLAMA_MODEL = "llama3.2:3b"
+DEFAULT_OLLAMA_TIMEOUT = 15  # seconds
+
+class IncompleteStreamError(RuntimeError):
+    """Raised when an Ollama stream ends without its final "done" chunk"""
+
 
 class CVDLlamaAdvisor:
     """
     Local Llama advisor for personalized CVD and environmental health advice
     """
     
-    def __init__(self, model_name: str = "llama3.2:3b"):
-        self.ollama_url = "http://localhost:11434/api/generate"
-        self.model = model_name
-        self.timeout = 15  # seconds
+    def __init__(self, model_name: Optional[str] = None, cache_size: int = 1024,
+                 cache_ttl: float = 24 * 3600, cache_path: Optional[str] = None,
+                 availability_ttl: float = 30, base_url: Optional[str] = None,
+                 timeout: Optional[float] = None, max_concurrent: int = 2,
+                 queue_timeout: float = 0.25, failure_threshold: int = 3,
+                 slow_call_seconds: Optional[float] = None, probe_interval: float = 15):
+        self.base_url = (base_url or os.environ.get('OLLAMA_URL', DEFAULT_OLLAMA_URL)).rstrip('/')
+        self.ollama_url = f"{self.base_url}/api/generate"
+        self.tags_url = f"{self.base_url}/api/tags"
+        self.model = model_name or os.environ.get('OLLAMA_MODEL', DEFAULT_OLLAMA_MODEL)
+        self.timeout = timeout if timeout is not None else float(
+            os.environ.get('OLLAMA_TIMEOUT', DEFAULT_OLLAMA_TIMEOUT))
+        self.probe_timeout = 2  # seconds, for the /api/tags liveness check
         
         # Setup logging
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
         
+        # Advice depends only on the prompt inputs, so identical profiles share a response
+        cache_path = cache_path or os.environ.get('CVD_ADVICE_CACHE_PATH')
+        self.cache = AdviceCache(cache_size, cache_ttl, cache_path) if cache_size > 0 else None
+        
+        # Keep-alive connection pool shared by every Ollama request
+        self.session = self._create_session()
+        
+        # A single local model serves generations one or two at a time, so cap the
+        # in-flight calls and answer interactive callers with fallback advice rather
+        # than queueing; background callers pass a longer queue_timeout
+        self.queue_timeout = queue_timeout
+        self._generation_slots = threading.BoundedSemaphore(max_concurrent)
+        
+        # Stop calling Ollama after repeated failures or slow calls until /api/tags recovers
+        self.breaker = CircuitBreaker(
+            failure_threshold=failure_threshold,
+            slow_call_seconds=slow_call_seconds if slow_call_seconds is not None else self.timeout * 2 / 3,
+            probe_interval=probe_interval,
+            probe=lambda: self._probe_tags()[1]
+        )
+        
+        # Cached liveness, refreshed in the background once older than availability_ttl
+        self.availability_ttl = availability_ttl
+        self._available = False
+        self._ollama_running = False
+        self._checked_at = None
+        self._check_lock = threading.Lock()
+        self._checking = False
+    
+    def _create_session(self) -> requests.Session:
+        """
+        Build a pooled session that retries connection failures with backoff
+        """
+        # Read timeouts are not retried so a slow generation is not repeated
+        retry = Retry(
+            total=2,
+            connect=2,
+            read=0,
+            status=2,
+            backoff_factor=0.2,
+            status_forcelist=[502, 503, 504],
+            allowed_methods=["GET", "POST"]
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=16, max_retries=retry)
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        # The liveness probe should fail fast rather than back off
+        session.mount(self.tags_url, HTTPAdapter(pool_connections=1, pool_maxsize=2, max_retries=0))
+        session.headers.update({'Content-Type': 'application/json'})
+        return session
+    
+    def reset_session(self):
+        """
+        Drop pooled connections, e.g. in a worker forked after the pool was used
+        """
+        self.session.close()
+        self.session = self._create_session()
+        
     def get_environmental_advice(self, risk_level: str, environmental_data: Dict, user_data: Dict) -> str:
         """
         Generate personalized environmental and lifestyle advice based on CVD risk and location
         """
         try:
-            prompt = self._build_advice_prompt(risk_level, environmental_data, user_data)
-            advice = self._query_llama(prompt)
+            cache_key = self._advice_cache_key(risk_level, environmental_data, user_data)
+            if self.cache is not None:
+                cached_advice = self.cache.get(cache_key)
+                if cached_advice is not None:
+                    return cached_advice
+            
+            if not self._acquire_generation_slot():
+                return self.get_fallback_advice(risk_level, environmental_data)
+            start = time.perf_counter()
+            try:
+                prompt = self._build_advice_prompt(risk_level, environmental_data, user_data)
+                advice = self._query_llama(prompt)
+                succeeded = bool(advice and len(advice.strip()) > 20)
+                self.breaker.record(succeeded, time.perf_counter() - start)
+            except Exception:
+                # Hand back the admission, or a half-open trial would never finish
+                self.breaker.cancel()
+                raise
+            finally:
+                self._generation_slots.release()
             
-            # Validate and clean response
-            if advice and len(advice.strip()) > 20:
-                return self._clean_response(advice)
+            # Validate and clean response; only genuine LLM advice is cached
+            if succeeded:
+                advice = self._clean_response(advice)
+                if self.cache is not None:
+                    self.cache.put(cache_key, advice)
+                return advice
             else:
-                return self._get_fallback_advice(risk_level, environmental_data)
+                return self.get_fallback_advice(risk_level, environmental_data)
                 
         except Exception as e:
             self.logger.error(f"Error generating LLM advice: {str(e)}")
-            return self._get_fallback_advice(risk_level, environmental_data)
+            return self.get_fallback_advice(risk_level, environmental_data)
+    
+    def get_cached_advice(self, risk_level: str, environmental_data: Dict, user_data: Dict) -> Optional[str]:
+        """
+        Return cached advice for this profile without querying Ollama
+        """
+        if self.cache is None:
+            return None
+        return self.cache.get(self._advice_cache_key(risk_level, environmental_data, user_data))
+    
+    def stream_environmental_advice(self, risk_level: str, environmental_data: Dict, user_data: Dict,
+                                    check_cache: bool = True,
+                                    queue_timeout: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Generate advice as a stream of events using Ollama's streaming mode
+        
+        Yields {'token': text} while the model generates, then a final
+        {'done': True, 'advice': text, 'llm_available': bool} event. Advice is
+        only kept, cleaned and cached once the stream has completed; a stream
+        cut short counts as a failed call and is replaced by fallback advice.
+        
+        queue_timeout overrides how long to wait for a free generation slot.
+        """
+        cache_key = self._advice_cache_key(risk_level, environmental_data, user_data)
+        if check_cache and self.cache is not None:
+            cached_advice = self.cache.get(cache_key)
+            if cached_advice is not None:
+                yield {'done': True, 'advice': cached_advice, 'llm_available': True}
+                return
+        
+        chunks = []
+        complete = False
+        if self._acquire_generation_slot(queue_timeout):
+            start = time.perf_counter()
+            try:
+                prompt = self._build_advice_prompt(risk_level, environmental_data, user_data)
+                for token in self._stream_llama(prompt):
+                    chunks.append(token)
+                    yield {'token': token}
+                complete = True
+            except GeneratorExit:
+                # The consumer went away; that says nothing about Ollama's health
+                self.breaker.cancel()
+                raise
+            except Exception as e:
+                self.logger.error(f"Error streaming LLM advice: {str(e)}")
+            finally:
+                self._generation_slots.release()
+            complete = complete and len("".join(chunks).strip()) > 20
+            self.breaker.record(complete, time.perf_counter() - start)
+        
+        advice = "".join(chunks).strip()
+        if complete:
+            advice = self._clean_response(advice)
+            if self.cache is not None:
+                self.cache.put(cache_key, advice)
+            yield {'done': True, 'advice': advice, 'llm_available': True}
+        else:
+            yield {'done': True, 'advice': self.get_fallback_advice(risk_level, environmental_data),
+                   'llm_available': False}
+    
+    def _acquire_generation_slot(self, queue_timeout: Optional[float] = None) -> bool:
+        """
+        Admit a generation if the breaker allows it and a slot frees up within queue_timeout
+        """
+        if not self.breaker.allow_request():
+            return False
+        if queue_timeout is None:
+            queue_timeout = self.queue_timeout
+        if not self._generation_slots.acquire(timeout=queue_timeout):
+            self.breaker.cancel()
+            self.logger.warning("All Ollama generation slots busy - using fallback advice")
+            return False
+        return True
+    
+    def _advice_cache_key(self, risk_level: str, env_data: Dict, user_data: Dict) -> str:
+        """
+        Normalize the inputs of _build_advice_prompt into a cache key
+        """
+        return "|".join([
+            self.model,
+            risk_level.lower(),
+            str(env_data.get('borough', 'London')),
+            f"{env_data.get('pm25', 0):.1f}",
+            f"{env_data.get('no2', 0):.1f}",
+            str(user_data.get('Age', 'unknown'))
+        ])
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """
+        Hit/miss counters for the advice cache
+        """
+        if self.cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.cache.stats()}
     
     def _build_advice_prompt(self, risk_level: str, env_data: Dict, user_data: Dict) -> str:
         """
@@ -67,25 +267,16 @@ class CVDLlamaAdvisor:
         Query the local Ollama instance
         """
         try:
-            payload = {
-                "model": self.model,
-                "prompt": prompt,
-                "stream": False,
-                "options": {
-                    "temperature": 0.7,
-                    "top_p": 0.9,
-                    "num_predict": 150  # Limit response length
-                }
-            }
+            payload = self._build_payload(prompt, stream=False)
             
             self.logger.info(f"Querying Ollama with model: {self.model}")
             
-            response = requests.post(
-                self.ollama_url, 
-                json=payload,
-                timeout=self.timeout,
-                headers={'Content-Type': 'application/json'}
-            )
+            with span('ollama_generate'):
+                response = self.session.post(
+                    self.ollama_url,
+                    json=payload,
+                    timeout=self.timeout
+                )
             
             if response.status_code == 200:
                 result = response.json()
@@ -95,7 +286,7 @@ class CVDLlamaAdvisor:
                 return None
                 
         except requests.exceptions.ConnectionError:
-            self.logger.error("Cannot connect to Ollama. Is it running on localhost:11434?")
+            self.logger.error(f"Cannot connect to Ollama. Is it running at {self.base_url}?")
             return None
         except requests.exceptions.Timeout:
             self.logger.error("Ollama request timed out")
@@ -104,6 +295,65 @@ class CVDLlamaAdvisor:
             self.logger.error(f"Unexpected error querying Ollama: {str(e)}")
             return None
     
+    def _stream_llama(self, prompt: str) -> Iterator[str]:
+        """
+        Query the local Ollama instance with stream: true, yielding tokens as they arrive
+        
+        Returns only once Ollama's final "done" chunk has arrived; an error
+        status, a dropped connection or a timeout part-way through raises.
+        """
+        payload = self._build_payload(prompt, stream=True)
+        self.logger.info(f"Streaming from Ollama with model: {self.model}")
+        
+        start = time.perf_counter()
+        first_token = True
+        try:
+            with self.session.post(
+                self.ollama_url,
+                json=payload,
+                timeout=self.timeout,
+                stream=True
+            ) as response:
+                if response.status_code != 200:
+                    raise IncompleteStreamError(f"Ollama stream failed with status: {response.status_code}")
+                
+                # Ollama sends one JSON object per line until "done" is true
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("response"):
+                        if first_token:
+                            observe('ollama_first_token', time.perf_counter() - start)
+                            first_token = False
+                        yield chunk["response"]
+                    if chunk.get("done"):
+                        observe('ollama_stream', time.perf_counter() - start)
+                        return
+            raise IncompleteStreamError("Ollama stream ended before its final chunk")
+        
+        except requests.exceptions.ConnectionError:
+            self.logger.error(f"Cannot connect to Ollama. Is it running at {self.base_url}?")
+            raise
+        except requests.exceptions.Timeout:
+            self.logger.error("Ollama stream timed out")
+            raise
+    
+    def _build_payload(self, prompt: str, stream: bool) -> Dict[str, Any]:
+        """
+        Build the /api/generate request body
+        """
+        return {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": stream,
+            "options": {
+                "temperature": 0.7,
+                "top_p": 0.9,
+                "num_predict": 150  # Limit response length
+            }
+        }
+    
     def _clean_response(self, response: str) -> str:
         """
         Clean and format the LLM response
@@ -117,7 +367,7 @@ class CVDLlamaAdvisor:
         
         return response
     
-    def _get_fallback_advice(self, risk_level: str, env_data: Dict) -> str:
+    def get_fallback_advice(self, risk_level: str, env_data: Dict) -> str:
         """
         Provide fallback advice when LLM is unavailable
         """
@@ -149,33 +399,60 @@ class CVDLlamaAdvisor:
     def check_ollama_availability(self) -> bool:
         """
         Check if Ollama is running and the model is available
+        
+        Uses the lightweight /api/tags listing rather than a generation, and
+        refreshes the cached status used by is_available().
+        """
+        self._refresh_availability()
+        return self._available
+    
+    def is_available(self) -> bool:
+        """
+        Return the cached availability, re-checking in the background once it is stale
+        """
+        if self._checked_at is None:
+            return self.check_ollama_availability()
+        if time.monotonic() - self._checked_at > self.availability_ttl:
+            self._refresh_in_background()
+        return self._available
+    
+    def _refresh_in_background(self):
+        with self._check_lock:
+            if self._checking:
+                return
+            self._checking = True
+        threading.Thread(target=self._refresh_availability, daemon=True).start()
+    
+    def _refresh_availability(self):
+        try:
+            self._ollama_running, self._available = self._probe_tags()
+        finally:
+            self._checked_at = time.monotonic()
+            with self._check_lock:
+                self._checking = False
+    
+    def _probe_tags(self) -> Tuple[bool, bool]:
+        """
+        Liveness probe: (ollama_running, model_available) from /api/tags
         """
         try:
-            # Test connection with a simple query
-            test_response = self._query_llama("Hello")
-            return test_response is not None
-        except:
-            return False
+            response = self.session.get(self.tags_url, timeout=self.probe_timeout)
+            if response.status_code != 200:
+                return False, False
+            models = response.json().get("models", [])
+            return True, any(m.get("name") == self.model for m in models)
+        except Exception:
+            return False, False
     
     def get_model_info(self) -> Dict[str, Any]:
         """
         Get information about the current model
         """
-        try:
-            response = requests.get("http://localhost:11434/api/tags", timeout=5)
-            if response.status_code == 200:
-                models = response.json().get("models", [])
-                current_model = next((m for m in models if m["name"] == self.model), None)
-                return {
-                    "model_name": self.model,
-                    "available": current_model is not None,
-                    "ollama_running": True
-                }
-        except:
-            pass
-        
+        self._refresh_availability()
         return {
             "model_name": self.model,
-            "available": False,
-            "ollama_running": False
-        }
\ No newline at end of file
+            "ollama_url": self.base_url,
+            "circuit": self.breaker.stats(),
+            "available": self._available,
+            "ollama_running": self._ollama_running
+        }
@@ -0,0 +1,160 @@
+import os
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+from prediction_cache import PredictionCache
+from instrumentation import observe, span
+
+
+class MicroBatchScorer:
+    """
+    Coalesces concurrent single-row predictions into one model call
+
+    Request threads encode their row and queue it; a scoring thread takes the
+    first queued row, keeps collecting until max_batch_size rows are waiting or
+    max_wait_ms has passed, scores them as one matrix and resolves each caller's
+    future. predict_risk() is a drop-in for CVDRiskModel.predict_risk; it times
+    the caller's encoding as 'encode' and its wait for the batch as 'microbatch'.
+
+    When the queue already holds max_queue rows, a request is scored inline
+    rather than waiting. max_wait_ms and max_batch_size can be changed at runtime.
+    """
+
+    def __init__(self, model, max_wait_ms: float = 2.0, max_batch_size: int = 64,
+                 max_queue: int = 1024, result_timeout: float = 5.0):
+        self.model = model
+        self.max_wait_ms = max_wait_ms
+        self.max_batch_size = max_batch_size
+        self.max_queue = max_queue
+        self.result_timeout = result_timeout
+        self.logger = logging.getLogger(__name__)
+
+        self._stats_lock = threading.Lock()
+        self._stats = {'requests': 0, 'batches': 0, 'batched_rows': 0, 'largest_batch': 0,
+                       'inline': 0, 'cache_hits': 0}
+        self._start_lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+
+    @classmethod
+    def from_env(cls, model) -> Optional['MicroBatchScorer']:
+        """Build a scorer when CVD_MICROBATCH=1, tuned by CVD_MICROBATCH_WAIT_MS/_MAX_ROWS/_QUEUE"""
+        if os.environ.get('CVD_MICROBATCH', '').lower() not in ('1', 'true', 'yes'):
+            return None
+        return cls(model,
+                   max_wait_ms=float(os.environ.get('CVD_MICROBATCH_WAIT_MS', 2.0)),
+                   max_batch_size=int(os.environ.get('CVD_MICROBATCH_MAX_ROWS', 64)),
+                   max_queue=int(os.environ.get('CVD_MICROBATCH_QUEUE', 1024)))
+
+    def _ensure_started(self):
+        # Started lazily and per process, so a scorer created before a gunicorn fork still works
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.max_queue)
+            threading.Thread(target=self._run, args=(self._queue,), daemon=True,
+                             name='micro-batcher').start()
+            self._pid = os.getpid()
+
+    def submit(self, user_input: Dict) -> Future:
+        """Queue one patient for scoring; the future resolves to a predict_risk result"""
+        if self.model.model is None:
+            raise ValueError("Model not trained or loaded")
+        self._ensure_started()
+        self._count('requests')
+
+        future = Future()
+        with span('encode'):
+            X_row = self.model.data_processor.prepare_single_prediction(user_input)[0]
+
+        cache = self.model.prediction_cache
+        cache_key = None
+        if cache is not None:
+            cache_key = PredictionCache.key_for(X_row)
+            cached = cache.get(cache_key, self.model.version)
+            if cached is not None:
+                self._count('cache_hits')
+                future.set_result(cached)
+                return future
+
+        try:
+            self._queue.put_nowait((X_row, future, cache_key, time.perf_counter()))
+        except queue.Full:
+            self._count('inline')
+            self._score([(X_row, future, cache_key, time.perf_counter())])
+        return future
+
+    def predict_risk(self, user_input: Dict) -> Dict[str, Any]:
+        future = self.submit(user_input)
+        # Scoring happens on the batching thread, so the caller's queue wait plus
+        # batch time is what shows up in its own timing breakdown
+        with span('microbatch'):
+            return future.result(timeout=self.result_timeout)
+
+    def _run(self, work_queue):
+        while True:
+            batch = [work_queue.get()]
+            deadline = time.perf_counter() + self.max_wait_ms / 1000
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(work_queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._score(batch)
+
+    def _score(self, batch):
+        start = time.perf_counter()
+        try:
+            version = self.model.version
+            results = self.model.predict_risk_rows(np.vstack([item[0] for item in batch]))
+            predictions = results['risk_prediction']
+            probabilities = results['risk_probability']
+            levels = results['risk_level']
+        except Exception as e:
+            self.logger.error(f"Micro-batch of {len(batch)} rows failed: {str(e)}")
+            for item in batch:
+                item[1].set_exception(e)
+            return
+
+        cache = self.model.prediction_cache
+        for i, (_, future, cache_key, queued_at) in enumerate(batch):
+            result = {
+                'risk_prediction': int(predictions[i]),
+                'risk_probability': float(probabilities[i]),
+                'risk_level': levels[i]
+            }
+            if cache is not None and cache_key is not None:
+                cache.put(cache_key, version, result)
+            observe('microbatch_queue_wait', start - queued_at)
+            future.set_result(result)
+
+        with self._stats_lock:
+            self._stats['batches'] += 1
+            self._stats['batched_rows'] += len(batch)
+            self._stats['largest_batch'] = max(self._stats['largest_batch'], len(batch))
+
+    def _count(self, key):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Batching counters, current queue depth and the tuning knobs"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['mean_batch_size'] = stats['batched_rows'] / stats['batches'] if stats['batches'] else 0.0
+        stats['queue_depth'] = self._queue.qsize() if self._queue is not None else 0
+        stats['max_wait_ms'] = self.max_wait_ms
+        stats['max_batch_size'] = self.max_batch_size
+        stats['max_queue'] = self.max_queue
+        return stats
@@ -2,86 +2,343 @@ import pandas as pd
 import numpy as np
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.linear_model import LogisticRegression
-from sklearn.model_selection import train_test_split, cross_val_score
+from sklearn.base import clone
+from sklearn.model_selection import train_test_split, StratifiedKFold
 from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
+from sklearn.utils.class_weight import compute_class_weight
 import joblib
+from joblib import Parallel, delayed
 import os
+import time
 from data_processor import CVDDataProcessor
+from model_artifact import save_artifact, load_artifact, ArtifactLogisticRegression, ARTIFACT_SUFFIX
+from forest_engine import FlatForest, normalize_leaf_values
+from prediction_cache import PredictionCache
+from instrumentation import span
+
+# Upper bounds of each risk bucket used by _get_risk_level
+RISK_LEVEL_THRESHOLDS = [0.2, 0.4, 0.6, 0.8]
+RISK_LEVELS = ["Very Low Risk", "Low Risk", "Moderate Risk", "High Risk", "Very High Risk"]
+
+# Above this many rows scikit-learn's compiled tree traversal beats the NumPy engine
+ENGINE_MAX_BATCH_ROWS = 256
+
+# Incremental refresh: trees fitted on each batch of new records, and the smallest batch accepted
+REFRESH_NEW_TREES = 20
+MIN_REFRESH_RECORDS = 50
+
+# Drift limits past which refresh_model falls back to a full retrain
+DRIFT_THRESHOLDS = {
+    'max_mean_shift': 0.5,            # largest feature mean shift, in training standard deviations
+    'max_unseen_category_rate': 0.05,  # share of new records with a category never seen in training
+    'max_accuracy_drop': 0.05         # fall in accuracy on the new records below the reference accuracy
+}
+
+# Default hyperparameters per model type; CVDRiskModel(model_params=...) overrides them
+DEFAULT_MODEL_PARAMS = {
+    'random_forest': {
+        'n_estimators': 200,
+        'random_state': 42,
+        'max_depth': 15,
+        'min_samples_split': 3,
+        'class_weight': 'balanced',
+        'min_samples_leaf': 2
+    },
+    'logistic_regression': {
+        'random_state': 42,
+        'max_iter': 1000,
+        'class_weight': 'balanced',
+        'C': 1.0
+    }
+}
+
+def _fit_fold(estimator, X, y, train_idx, test_idx, keep_model=False):
+    """Fit a fresh copy of estimator on one CV fold and predict its held-out rows
+    
+    The fitted copy is only returned when keep_model is set, so other folds'
+    models are freed (and not sent back from worker processes).
+    """
+    fold_model = clone(estimator)
+    fold_model.fit(X[train_idx], y[train_idx])
+    return fold_model if keep_model else None, fold_model.classes_, fold_model.predict_proba(X[test_idx])
+
+def evaluate_model(estimator, X, y, cv=5, n_jobs=-1, random_state=42, keep_model=False):
+    """Run stratified k-fold CV in parallel, keeping the fold predictions
+    
+    Returns a dict with each fold's held-out indices, the out-of-fold
+    probabilities and predictions, the per-fold accuracy scores and the
+    accuracy over all out-of-fold predictions. With keep_model=True it also
+    holds the first fold's fitted model as 'model'.
+    """
+    X = np.asarray(X)
+    y = np.asarray(y)
+    splitter = StratifiedKFold(n_splits=cv, shuffle=True, random_state=random_state)
+    folds = list(splitter.split(X, y))
+    
+    fitted = Parallel(n_jobs=n_jobs)(
+        delayed(_fit_fold)(estimator, X, y, train_idx, test_idx, keep_model and i == 0)
+        for i, (train_idx, test_idx) in enumerate(folds)
+    )
+    
+    # Assemble out-of-fold predictions so every metric comes from the same fits
+    classes = fitted[0][1]
+    oof_proba = np.zeros((len(y), len(classes)))
+    for (_, _, fold_proba), (_, test_idx) in zip(fitted, folds):
+        oof_proba[test_idx] = fold_proba
+    oof_pred = classes[np.argmax(oof_proba, axis=1)]
+    cv_scores = np.array([accuracy_score(y[test_idx], oof_pred[test_idx]) for _, test_idx in folds])
+    
+    results = {
+        'test_indices': [test_idx for _, test_idx in folds],
+        'oof_proba': oof_proba,
+        'oof_pred': oof_pred,
+        'cv_scores': cv_scores,
+        'accuracy': float(accuracy_score(y, oof_pred))
+    }
+    if keep_model:
+        results['model'] = fitted[0][0]
+    return results
 
 class CVDRiskModel:
-    def __init__(self, model_type='random_forest'):
+    def __init__(self, model_type='random_forest', model_params=None, prediction_cache_size=None):
         self.model_type = model_type
+        self.model_params = model_params or {}
         self.model = None
+        self.engine = None
+        self.version = 0
         self.data_processor = CVDDataProcessor()
         
+        # Accuracy on records the model was not trained on (out-of-fold when cross-validated)
+        # at the last full training, and incremental updates since
+        self.reference_accuracy = None
+        self.refresh_count = 0
+        
+        # Optional memoization of predict_risk; CVD_PREDICTION_CACHE_SIZE=0 (the default) disables it
+        if prediction_cache_size is None:
+            prediction_cache_size = int(os.environ.get('CVD_PREDICTION_CACHE_SIZE', 0))
+        self.prediction_cache = PredictionCache(prediction_cache_size) if prediction_cache_size > 0 else None
+    
+    def _model_changed(self):
+        """Drop state derived from the previous model: the compiled engine and cached predictions"""
+        self.engine = None
+        self.version += 1
+        
     def create_model(self):
         """Create the ML model based on specified type"""
+        if self.model_type not in DEFAULT_MODEL_PARAMS:
+            raise ValueError("Unsupported model type")
+        params = {**DEFAULT_MODEL_PARAMS[self.model_type], **self.model_params}
+        self._model_changed()
+        
         if self.model_type == 'random_forest':
-            self.model = RandomForestClassifier(
-                n_estimators=200,
-                random_state=42,
-                max_depth=15,
-                min_samples_split=3,
-                class_weight='balanced',
-                min_samples_leaf=2
-            )
+            self.model = RandomForestClassifier(**params)
         elif self.model_type == 'logistic_regression':
-            self.model = LogisticRegression(
-                random_state=42,
-                max_iter=1000,
-                class_weight='balanced',
-                C=1.0
-            )
-        else:
-            raise ValueError("Unsupported model type")
+            self.model = LogisticRegression(**params)
     
-    def train_model(self):
-        """Train the CVD risk prediction model"""
-        # Load and preprocess data
-        raw_data = self.data_processor.load_data()
-        X, y, processed_data = self.data_processor.preprocess_data(raw_data)
+    def train_model(self, cv=5, skip_cv=False, n_jobs=-1):
+        """Train the CVD risk prediction model
         
-        # Split data
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=0.2, random_state=42, stratify=y
-        )
+        The k CV folds are fitted in parallel and reused: the first fold's model
+        is kept as the trained model and its held-out fold (1/cv of the data,
+        20% by default) gives the test accuracy and classification report.
+        With skip_cv=True a single model is fitted on an 80/20 split.
+        """
+        # Load and preprocess data (memory-mapped from the dataset cache when unchanged)
+        X, y = self.data_processor.load_training_data()
         
-        # Create and train model
         self.create_model()
-        self.model.fit(X_train, y_train)
+        
+        if skip_cv:
+            # Split data
+            X_train, X_test, y_train, y_test = train_test_split(
+                X, y, test_size=0.2, random_state=42, stratify=y
+            )
+            self.model.fit(X_train, y_train)
+            y_pred = self.model.predict(X_test)
+            cv_scores = np.array([])
+            self.cv_results = None
+        else:
+            self.cv_results = evaluate_model(self.model, X, y, cv=cv, n_jobs=n_jobs, keep_model=True)
+            # The selected model lives on self.model only; cv_results keeps the scores
+            self.model = self.cv_results.pop('model')
+            self._model_changed()
+            test_idx = self.cv_results['test_indices'][0]
+            y_test = y[test_idx]
+            y_pred = self.cv_results['oof_pred'][test_idx]
+            cv_scores = self.cv_results['cv_scores']
         
         # Evaluate model
-        y_pred = self.model.predict(X_test)
         accuracy = accuracy_score(y_test, y_pred)
-        
-        # Cross-validation
-        cv_scores = cross_val_score(self.model, X, y, cv=5)
+        self.reference_accuracy = float(accuracy) if skip_cv else self.cv_results['accuracy']
+        self.refresh_count = 0
         
         print(f"Model: {self.model_type}")
         print(f"Test Accuracy: {accuracy:.4f}")
-        print(f"Cross-validation Score: {cv_scores.mean():.4f} (+/- {cv_scores.std() * 2:.4f})")
+        if skip_cv:
+            print("Cross-validation Score: skipped")
+        else:
+            print(f"Cross-validation Score: {cv_scores.mean():.4f} (+/- {cv_scores.std() * 2:.4f})")
         print("\nClassification Report:")
         print(classification_report(y_test, y_pred))
         
         return accuracy, cv_scores
     
+    def check_drift(self, X_new, y_new, unseen_rate, thresholds=None):
+        """Compare new, already scaled records with the training data and the current model
+        
+        The scaler was fitted on the training data, so the mean of each scaled
+        column is its shift in training standard deviations.
+        """
+        thresholds = {**DRIFT_THRESHOLDS, **(thresholds or {})}
+        mean_shift = float(np.abs(X_new.mean(axis=0)).max())
+        accuracy = float(accuracy_score(y_new, self.model.predict(X_new)))
+        accuracy_drop = None if self.reference_accuracy is None else self.reference_accuracy - accuracy
+        
+        return {
+            'mean_shift': mean_shift,
+            'unseen_category_rate': unseen_rate,
+            'accuracy': accuracy,
+            'accuracy_drop': accuracy_drop,
+            'crossed': {
+                'mean_shift': mean_shift > thresholds['max_mean_shift'],
+                'unseen_category_rate': unseen_rate > thresholds['max_unseen_category_rate'],
+                'accuracy_drop': accuracy_drop is not None and accuracy_drop > thresholds['max_accuracy_drop']
+            }
+        }
+    
+    def refresh_model(self, new_records, n_new_trees=REFRESH_NEW_TREES, max_trees=None,
+                      drift_thresholds=None, n_jobs=None):
+        """Update the trained forest with newly arrived records instead of rebuilding it
+        
+        new_records is a CSV path or DataFrame of labelled health records. They
+        are encoded with the persisted label encoders and scaler, n_new_trees
+        trees are fitted on them with warm_start, and the oldest trees are
+        retired so at most max_trees (default: the configured n_estimators)
+        remain. When a drift threshold is crossed, or the model is not a
+        scikit-learn random forest, this falls back to train_model(), which
+        reads the full health CSV; it should already include the new records.
+        
+        A model loaded from an artifact cannot be refreshed, as the artifact
+        only holds its flattened copy; load the pickle with
+        prefer_artifact=False instead.
+        
+        Returns a report of what was done and why.
+        """
+        if self.model is None:
+            raise ValueError("Model not trained or loaded")
+        if isinstance(self.model, (FlatForest, ArtifactLogisticRegression)):
+            raise ValueError("Model was loaded from an artifact; load the pickle with "
+                             "prefer_artifact=False to refresh it")
+        start = time.perf_counter()
+        
+        new_records = self.data_processor.load_new_records(new_records)
+        X_new, y_new, unseen_rate = self.data_processor.transform_new_records(new_records)
+        report = {'records': len(y_new)}
+        
+        if len(y_new) < MIN_REFRESH_RECORDS or len(np.unique(y_new)) < 2:
+            report['mode'] = 'skipped'
+            report['reason'] = f"needs at least {MIN_REFRESH_RECORDS} records covering both outcomes"
+            return report
+        
+        drift = self.check_drift(X_new, y_new, unseen_rate, drift_thresholds)
+        report['drift'] = drift
+        reasons = [f"{name} drift" for name, crossed in drift['crossed'].items() if crossed]
+        if not isinstance(self.model, RandomForestClassifier):
+            reasons.append(f"{type(self.model).__name__} cannot be updated incrementally")
+        
+        if reasons:
+            report['mode'] = 'full'
+            report['reason'] = ", ".join(reasons)
+            report['accuracy'], _ = self.train_model(n_jobs=-1 if n_jobs is None else n_jobs)
+        else:
+            params = {**DEFAULT_MODEL_PARAMS['random_forest'], **self.model_params}
+            max_trees = max_trees or params['n_estimators']
+            previous = self.model.get_params()
+            self.refresh_count += 1
+            
+            # The new trees weight classes by the new records' balance, set explicitly as
+            # warm_start does not accept the "balanced" preset
+            class_weight = previous['class_weight']
+            if class_weight == 'balanced':
+                classes = np.unique(y_new)
+                class_weight = dict(zip(classes, compute_class_weight('balanced', classes=classes, y=y_new)))
+            
+            # Fresh seeds per refresh, so retiring trees never replays earlier draws
+            self.model.set_params(
+                warm_start=True,
+                class_weight=class_weight,
+                n_estimators=len(self.model.estimators_) + n_new_trees,
+                random_state=(params.get('random_state') or 0) + self.refresh_count,
+                n_jobs=n_jobs if n_jobs is not None else previous['n_jobs']
+            )
+            self.model.fit(X_new, y_new)
+            
+            retired = max(0, len(self.model.estimators_) - max_trees)
+            del self.model.estimators_[:retired]
+            self.model.set_params(warm_start=False, n_estimators=len(self.model.estimators_),
+                                  class_weight=previous['class_weight'], n_jobs=previous['n_jobs'])
+            self._model_changed()
+            
+            report['mode'] = 'incremental'
+            report['trees_added'] = n_new_trees
+            report['trees_retired'] = retired
+            report['trees'] = len(self.model.estimators_)
+        
+        report['seconds'] = time.perf_counter() - start
+        return report
+    
     def save_model(self, filename='cvd_risk_model.pkl'):
         """Save the trained model and data processor"""
         model_data = {
             'model': self.model,
             'data_processor': self.data_processor,
-            'model_type': self.model_type
+            'model_type': self.model_type,
+            'reference_accuracy': self.reference_accuracy,
+            'refresh_count': self.refresh_count
         }
         joblib.dump(model_data, filename)
         print(f"Model saved as {filename}")
     
-    def load_model(self, filename='cvd_risk_model.pkl'):
-        """Load a trained model"""
+    def save_artifact(self, path='cvd_risk_model.artifact'):
+        """Save the trained model as a memory-mappable artifact directory"""
+        save_artifact(self.model_type, self.model, self.data_processor, path,
+                      self.reference_accuracy, self.refresh_count)
+        print(f"Model artifact saved as {path}")
+    
+    def load_artifact(self, path='cvd_risk_model.artifact'):
+        """Load a model artifact; its buffers are memory-mapped, not deserialized"""
+        self.model_type, self.model, self.data_processor, manifest = load_artifact(path)
+        self.reference_accuracy = manifest.get('reference_accuracy')
+        self.refresh_count = manifest.get('refresh_count', 0)
+        self._model_changed()
+        print(f"Model artifact loaded from {path}")
+        return True
+    
+    def load_model(self, filename='cvd_risk_model.pkl', prefer_artifact=True):
+        """Load a trained model
+        
+        An artifact directory converted from the pickle (same name, .artifact
+        suffix) is preferred when it is at least as new as the pickle, unless
+        prefer_artifact is False. Artifacts hold a flattened forest for serving,
+        so anything that updates the scikit-learn model must load the pickle.
+        """
+        artifact_path = filename if os.path.isdir(filename) else os.path.splitext(filename)[0] + ARTIFACT_SUFFIX
+        if prefer_artifact and os.path.isdir(artifact_path) and (
+            not os.path.exists(filename) or os.path.getmtime(artifact_path) >= os.path.getmtime(filename)
+        ):
+            return self.load_artifact(artifact_path)
+        
         if os.path.exists(filename):
             model_data = joblib.load(filename)
             self.model = model_data['model']
+            if isinstance(self.model, RandomForestClassifier):
+                # Pickles from scikit-learn < 1.4 hold class counts in their leaves
+                normalize_leaf_values(self.model)
             self.data_processor = model_data['data_processor']
             self.model_type = model_data['model_type']
+            self.reference_accuracy = model_data.get('reference_accuracy')
+            self.refresh_count = model_data.get('refresh_count', 0)
+            self._model_changed()
             print(f"Model loaded from {filename}")
             return True
         else:
@@ -94,17 +351,77 @@ class CVDRiskModel:
             raise ValueError("Model not trained or loaded")
         
         # Preprocess input
-        X_input = self.data_processor.prepare_single_prediction(user_input)
+        with span('encode'):
+            X_input = self.data_processor.prepare_single_prediction(user_input)
         
-        # Make prediction
-        risk_probability = self.model.predict_proba(X_input)[0]
-        risk_prediction = self.model.predict(X_input)[0]
+        # Repeat submissions of the same profile are answered from the cache
+        if self.prediction_cache is not None:
+            cache_key = PredictionCache.key_for(X_input)
+            cached = self.prediction_cache.get(cache_key, self.version)
+            if cached is not None:
+                return cached
         
-        return {
+        # Make prediction; the class is derived from the same forest pass
+        with span('inference'):
+            risk_probability = self._get_predictor().predict_proba(X_input)[0]
+        risk_prediction = self.model.classes_[np.argmax(risk_probability)]
+        
+        result = {
             'risk_prediction': int(risk_prediction),
             'risk_probability': float(risk_probability[1]),  # Probability of CVD risk
             'risk_level': self._get_risk_level(risk_probability[1])
         }
+        if self.prediction_cache is not None:
+            self.prediction_cache.put(cache_key, self.version, result)
+        return result
+    
+    def get_cache_stats(self):
+        """Prediction cache hit-rate metrics, or None when the cache is disabled"""
+        return self.prediction_cache.stats() if self.prediction_cache is not None else None
+    
+    def predict_risk_batch(self, user_inputs):
+        """Predict CVD risk for many users with a single model call
+        
+        Accepts a DataFrame, a list of dicts or an encoded NumPy array (see
+        CVDDataProcessor.prepare_batch_prediction) and returns columnar results.
+        """
+        if self.model is None:
+            raise ValueError("Model not trained or loaded")
+        
+        # Encode and scale every row at once
+        with span('batch_encode'):
+            X_input = self.data_processor.prepare_batch_prediction(user_inputs)
+        return self.predict_risk_rows(X_input)
+    
+    def predict_risk_rows(self, X_input):
+        """Score rows already encoded and scaled by the data processor, in one model call"""
+        if self.model is None:
+            raise ValueError("Model not trained or loaded")
+        
+        # One forest pass; class and risk level both come from the probabilities
+        with span('batch_inference'):
+            probabilities = self._get_predictor(len(X_input)).predict_proba(X_input)
+        risk_prediction = self.model.classes_[np.argmax(probabilities, axis=1)]
+        risk_probability = probabilities[:, 1]
+        
+        return {
+            'risk_prediction': risk_prediction.astype(int),
+            'risk_probability': risk_probability.astype(float),
+            'risk_level': self._get_risk_levels(risk_probability)
+        }
+    
+    def _get_predictor(self, n_rows=1):
+        """Return the flattened inference engine for forests on small inputs, otherwise the model itself"""
+        if isinstance(self.model, RandomForestClassifier) and n_rows <= ENGINE_MAX_BATCH_ROWS:
+            if self.engine is None:
+                self.engine = FlatForest.from_sklearn(self.model)
+            return self.engine
+        return self.model
+    
+    def _get_risk_levels(self, probabilities):
+        """Vectorized _get_risk_level over an array of probabilities"""
+        bucket = np.searchsorted(RISK_LEVEL_THRESHOLDS, probabilities, side='right')
+        return np.asarray(RISK_LEVELS, dtype=object)[bucket]
     
     def _get_risk_level(self, probability):
         """Convert probability to risk level with more granular thresholds"""
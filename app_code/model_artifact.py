@@ -0,0 +1,140 @@
+"""
+Versioned, memory-mappable model artifact
+
+An artifact is a directory holding a JSON manifest plus flat .npy buffers for
+the forest's node arrays (or the logistic regression coefficients) and the
+encoder/scaler parameters. Buffers are opened with mmap_mode='r', so loading
+does not deserialize an object graph and forked workers share the same pages.
+
+Convert an existing pickle with:
+    python model_artifact.py cvd_risk_model.pkl cvd_risk_model.artifact
+"""
+import os
+import sys
+import json
+import shutil
+import numpy as np
+from scipy.special import expit
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+from data_processor import CVDDataProcessor
+from forest_engine import FlatForest, flatten_forest
+
+ARTIFACT_FORMAT_VERSION = 2
+ARTIFACT_SUFFIX = '.artifact'
+MANIFEST_NAME = 'manifest.json'
+
+
+class ArtifactLogisticRegression:
+    """Binary logistic regression evaluated from its coefficient buffers"""
+
+    def __init__(self, arrays, classes):
+        self.coef_ = arrays['coef']
+        self.intercept_ = arrays['intercept']
+        self.classes_ = np.asarray(classes)
+
+    def predict_proba(self, X):
+        decision = (np.asarray(X, dtype=np.float64) @ self.coef_.T + self.intercept_).ravel()
+        positive = expit(decision)
+        return np.column_stack([1.0 - positive, positive])
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+def save_artifact(model_type, model, data_processor, path, reference_accuracy=None, refresh_count=0):
+    """Write a trained model and its data processor as an artifact directory
+
+    reference_accuracy and refresh_count are kept in the manifest so drift
+    checks behave the same whether the pickle or the artifact is loaded.
+    """
+    if model_type == 'random_forest':
+        arrays = flatten_forest(model)
+    elif model_type == 'logistic_regression':
+        arrays = {
+            'coef': np.asarray(model.coef_, dtype=np.float64),
+            'intercept': np.asarray(model.intercept_, dtype=np.float64)
+        }
+    else:
+        raise ValueError("Unsupported model type")
+
+    scaler = data_processor.scaler
+    arrays['scaler_mean'] = np.asarray(scaler.mean_, dtype=np.float64)
+    arrays['scaler_scale'] = np.asarray(scaler.scale_, dtype=np.float64)
+
+    manifest = {
+        'format_version': ARTIFACT_FORMAT_VERSION,
+        'model_type': model_type,
+        'classes': [int(c) for c in model.classes_],
+        'feature_columns': list(data_processor.feature_columns),
+        'categories': {col: [str(label) for label in encoder.classes_]
+                       for col, encoder in data_processor.label_encoders.items()},
+        'scaler_n_samples_seen': int(np.max(scaler.n_samples_seen_)),
+        'reference_accuracy': None if reference_accuracy is None else float(reference_accuracy),
+        'refresh_count': int(refresh_count),
+        'arrays': sorted(arrays)
+    }
+
+    # Write to a sibling directory and swap it in so readers never see a partial artifact
+    tmp_path = path.rstrip(os.sep) + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_path, name + '.npy'), np.ascontiguousarray(array))
+    with open(os.path.join(tmp_path, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    return manifest
+
+
+def load_artifact(path, mmap_mode='r'):
+    """Load an artifact, returning (model_type, model, data_processor, manifest)"""
+    with open(os.path.join(path, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('format_version') != ARTIFACT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported artifact format version: {manifest.get('format_version')}")
+
+    arrays = {name: np.load(os.path.join(path, name + '.npy'), mmap_mode=mmap_mode)
+              for name in manifest['arrays']}
+
+    if manifest['model_type'] == 'random_forest':
+        model = FlatForest(arrays, manifest['classes'])
+    else:
+        model = ArtifactLogisticRegression(arrays, manifest['classes'])
+
+    # Rebuild the fitted encoders and scaler from their parameters only
+    data_processor = CVDDataProcessor()
+    data_processor.feature_columns = manifest['feature_columns']
+    for col, labels in manifest['categories'].items():
+        encoder = LabelEncoder()
+        encoder.classes_ = np.asarray(labels, dtype=object)
+        data_processor.label_encoders[col] = encoder
+    scaler = StandardScaler()
+    scaler.mean_ = arrays['scaler_mean']
+    scaler.scale_ = arrays['scaler_scale']
+    scaler.var_ = np.square(arrays['scaler_scale'])
+    scaler.n_features_in_ = len(manifest['feature_columns'])
+    scaler.n_samples_seen_ = manifest['scaler_n_samples_seen']
+    data_processor.scaler = scaler
+
+    return manifest['model_type'], model, data_processor, manifest
+
+
+def convert_pickle(pkl_path, artifact_path=None):
+    """Convert a joblib pickle written by CVDRiskModel.save_model into an artifact"""
+    import joblib
+
+    artifact_path = artifact_path or os.path.splitext(pkl_path)[0] + ARTIFACT_SUFFIX
+    model_data = joblib.load(pkl_path)
+    save_artifact(model_data['model_type'], model_data['model'], model_data['data_processor'], artifact_path,
+                  model_data.get('reference_accuracy'), model_data.get('refresh_count', 0))
+    return artifact_path
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python model_artifact.py <model.pkl> [output.artifact]")
+        sys.exit(1)
+    output = convert_pickle(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
+    print(f"Artifact written to {output}")
@@ -0,0 +1,79 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+
+import numpy as np
+
+
+class PredictionCache:
+    """
+    Bounded LRU cache of predict_risk results keyed on the encoded feature row
+
+    The row already includes the borough's environmental values, so a change to
+    the environmental data produces new keys. Each entry is tagged with the
+    model version it was computed under; the cache empties itself the first
+    time it is used with a different version (a retrained or reloaded model).
+    """
+
+    def __init__(self, max_size: int = 4096):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+        self._lock = threading.Lock()
+        self._version = None
+        self._entries: "OrderedDict[bytes, Dict[str, Any]]" = OrderedDict()
+
+    @staticmethod
+    def key_for(row: np.ndarray) -> bytes:
+        """Hash a feature row; adding 0.0 folds -0.0 into 0.0 so equal values share a key"""
+        canonical = np.ascontiguousarray(row, dtype=np.float64) + 0.0
+        return hashlib.blake2b(canonical.tobytes(), digest_size=16).digest()
+
+    def get(self, key: bytes, version: int) -> Optional[Dict[str, Any]]:
+        """Return a copy of the cached result, or None on a miss"""
+        with self._lock:
+            self._check_version(version)
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(result)
+
+    def put(self, key: bytes, version: int, result: Dict[str, Any]):
+        """Store a result, evicting the least recently used entries"""
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = dict(result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'invalidations': self.invalidations
+            }
+
+    def _check_version(self, version: int):
+        # Caller holds the lock
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._version = version
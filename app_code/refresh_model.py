@@ -0,0 +1,55 @@
+from ml_model import CVDRiskModel, REFRESH_NEW_TREES, DRIFT_THRESHOLDS
+from model_artifact import ARTIFACT_SUFFIX
+import argparse
+import os
+import sys
+
+def main():
+    parser = argparse.ArgumentParser(description='Update the trained model with newly arrived records')
+    parser.add_argument('new_records', help='CSV of new labelled health records')
+    parser.add_argument('--model', default='cvd_risk_model.pkl', help='Model file to update in place')
+    parser.add_argument('--trees', type=int, default=REFRESH_NEW_TREES, help='Trees to fit on the new records')
+    parser.add_argument('--max-trees', type=int, help='Trees kept after retiring the oldest')
+    for name, value in DRIFT_THRESHOLDS.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=float, default=value,
+                            help='Drift threshold for a full retrain')
+    parser.add_argument('--n-jobs', type=int, help='Cores used to fit trees')
+    args = parser.parse_args()
+
+    print("Refreshing CVD Risk Assessment Model...")
+    print("=" * 50)
+
+    # The pickle holds the scikit-learn forest; a served artifact only holds its flattened copy
+    model = CVDRiskModel()
+    if not model.load_model(args.model, prefer_artifact=False):
+        sys.exit(1)
+
+    thresholds = {name: getattr(args, name) for name in DRIFT_THRESHOLDS}
+    report = model.refresh_model(args.new_records, n_new_trees=args.trees, max_trees=args.max_trees,
+                                 drift_thresholds=thresholds, n_jobs=args.n_jobs)
+
+    drift = report.get('drift')
+    if drift:
+        accuracy_drop = 'n/a' if drift['accuracy_drop'] is None else f"{drift['accuracy_drop']:+.4f}"
+        print(f"New records: {report['records']}, accuracy {drift['accuracy']:.4f} (drop {accuracy_drop}), "
+              f"mean shift {drift['mean_shift']:.3f} SD, unseen categories {drift['unseen_category_rate']:.1%}")
+
+    if report['mode'] == 'skipped':
+        print(f"Nothing updated: {report['reason']}")
+        return
+    if report['mode'] == 'full':
+        print(f"Full retrain ({report['reason']})")
+    else:
+        print(f"Added {report['trees_added']} trees, retired {report['trees_retired']}, "
+              f"{report['trees']} in the forest")
+    print(f"Refresh took {report['seconds']:.2f}s")
+
+    model.save_model(args.model)
+
+    # Rewrite the artifact too, or servers loading it would keep the old forest
+    artifact_path = os.path.splitext(args.model)[0] + ARTIFACT_SUFFIX
+    if os.path.isdir(artifact_path):
+        model.save_artifact(artifact_path)
+
+if __name__ == "__main__":
+    main()
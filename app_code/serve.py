@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Production entry point for the CVD risk assessment web apps
+
+Runs the chosen Flask app under gunicorn with several pre-forked workers, each
+with a thread pool. The app module (and so the model and environmental data) is
+imported once in the master before forking, and the imported objects are frozen
+out of the garbage collector so the workers share those pages copy-on-write.
+
+    python serve.py --app web_app --bind 0.0.0.0:5002 --workers 4 --threads 8
+
+Signals to the gunicorn master:
+    HUP   gracefully replace all workers
+    USR2  start a new master that re-imports the app (new model/code); then
+          send TERM to the old master for a zero-downtime upgrade
+    TERM  graceful shutdown
+
+Liveness and readiness are exposed at /healthz and /readyz. Without gunicorn
+(e.g. on Windows) the app runs on waitress if installed, otherwise on the
+threaded Werkzeug server.
+"""
+import os
+import gc
+import sys
+import argparse
+import importlib
+
+APPS = ['web_app', 'working_app', 'simple_web_app', 'hybrid_server']
+
+
+def load_app(module_name):
+    """Import an app module once and freeze the resulting heap for copy-on-write sharing"""
+    module = importlib.import_module(module_name)
+    gc.collect()
+    if hasattr(gc, 'freeze'):
+        gc.freeze()
+    return module
+
+
+def post_fork(server, worker):
+    """Give each worker its own Ollama connection pool"""
+    for module_name in APPS:
+        module = sys.modules.get(module_name)
+        advisor = getattr(module, 'llm_advisor', None) if module else None
+        if advisor is not None and hasattr(advisor, 'reset_session'):
+            advisor.reset_session()
+
+
+def run_gunicorn(args):
+    from gunicorn.app.base import BaseApplication
+
+    class AssessmentApplication(BaseApplication):
+        def __init__(self, options):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return load_app(args.app).app
+
+    AssessmentApplication({
+        'bind': args.bind,
+        'workers': args.workers,
+        'threads': args.threads,
+        'worker_class': 'gthread',
+        'preload_app': True,
+        'timeout': args.timeout,
+        'graceful_timeout': args.graceful_timeout,
+        'keepalive': 5,
+        'max_requests': args.max_requests,
+        'max_requests_jitter': args.max_requests // 10 if args.max_requests else 0,
+        'post_fork': post_fork,
+        'accesslog': '-' if args.access_log else None
+    }).run()
+
+
+def run_fallback(args):
+    app = load_app(args.app).app
+    host, _, port = args.bind.rpartition(':')
+    host = host or '0.0.0.0'
+    try:
+        from waitress import serve
+        print(f"gunicorn not available - serving {args.app} on waitress with {args.threads} threads")
+        serve(app, host=host, port=int(port), threads=args.threads)
+    except ImportError:
+        from werkzeug.serving import run_simple
+        print(f"gunicorn not available - serving {args.app} on the threaded Werkzeug server")
+        run_simple(host, int(port), app, threaded=True, use_reloader=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the CVD risk assessment app in production')
+    parser.add_argument('--app', choices=APPS, default=os.environ.get('CVD_APP', 'web_app'),
+                        help='App module to serve')
+    parser.add_argument('--bind', default=os.environ.get('CVD_BIND', '0.0.0.0:5002'),
+                        help='host:port to listen on')
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('CVD_WORKERS', os.cpu_count() or 1)),
+                        help='Number of pre-forked worker processes')
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('CVD_THREADS', 8)),
+                        help='Threads per worker')
+    parser.add_argument('--timeout', type=int, default=30,
+                        help='Seconds before an unresponsive worker is restarted')
+    parser.add_argument('--graceful-timeout', type=int, default=30,
+                        help='Seconds workers get to finish in-flight requests on reload/shutdown')
+    parser.add_argument('--max-requests', type=int, default=0,
+                        help='Recycle each worker after this many requests (0 disables)')
+    parser.add_argument('--access-log', action='store_true', help='Log every request to stdout')
+    args = parser.parse_args()
+
+    # App modules resolve data files relative to the working directory
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        run_fallback(args)
+        return
+    run_gunicorn(args)
+
+
+if __name__ == "__main__":
+    main()
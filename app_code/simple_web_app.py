@@ -1,6 +1,11 @@
 from flask import Flask, render_template, request, jsonify
-import pandas as pd
 from ml_model import CVDRiskModel
+from environment_index import BoroughEnvironmentIndex
+from health_checks import register_health_endpoints
+from micro_batcher import MicroBatchScorer
+from instrumentation import span, register_metrics
+from batch_assessment import register_batch_endpoint
+from what_if import register_what_if_endpoint
 import os
 
 app = Flask(__name__)
@@ -10,6 +15,17 @@ model = CVDRiskModel()
 if not model.load_model():
     print("Warning: Model not found. Please train the model first.")
 
+# Optionally coalesce concurrent predictions into batches (CVD_MICROBATCH=1)
+batcher = MicroBatchScorer.from_env(model)
+scorer = batcher or model
+
+# Borough environmental data, loaded once and reloaded when the CSV changes
+env_index = BoroughEnvironmentIndex()
+register_health_endpoints(app, model, env_index, batcher)
+register_metrics(app)
+register_batch_endpoint(app, model, env_index)
+register_what_if_endpoint(app, model, env_index)
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -18,45 +34,32 @@ def index():
 def assess_risk():
     try:
         # Get form data
-        user_data = {
-            'Age': int(request.form['age']),
-            'Gender': request.form['gender'],
-            'Smoker': request.form['smoker'],
-            'FamilyHistoryCVD': request.form['family_history'],
-            'Diabetes': request.form['diabetes'],
-            'HighBloodPressure': request.form['high_bp'],
-            'PhysicalActivityLevel': request.form['activity'],
-            'BMI': float(request.form['bmi']),
-            'TotalCholesterol': float(request.form['cholesterol']),
-            'SystolicBP': float(request.form['systolic_bp']),
-            'DiastolicBP': float(request.form['diastolic_bp']),
-            'AlcoholConsumption': request.form['alcohol'],
-            'StressLevel': request.form['stress'],
-            'SleepHours': float(request.form['sleep_hours']),
-            'Borough': request.form['borough']
-        }
+        with span('parse_form'):
+            user_data = {
+                'Age': int(request.form['age']),
+                'Gender': request.form['gender'],
+                'Smoker': request.form['smoker'],
+                'FamilyHistoryCVD': request.form['family_history'],
+                'Diabetes': request.form['diabetes'],
+                'HighBloodPressure': request.form['high_bp'],
+                'PhysicalActivityLevel': request.form['activity'],
+                'BMI': float(request.form['bmi']),
+                'TotalCholesterol': float(request.form['cholesterol']),
+                'SystolicBP': float(request.form['systolic_bp']),
+                'DiastolicBP': float(request.form['diastolic_bp']),
+                'AlcoholConsumption': request.form['alcohol'],
+                'StressLevel': request.form['stress'],
+                'SleepHours': float(request.form['sleep_hours']),
+                'Borough': request.form['borough']
+            }
         
-        # Load environmental data for the borough
-        env_data = pd.read_csv('../environmental_data/expanded_environmental_data.csv')
-        borough_env = env_data[env_data['Borough'] == user_data['Borough']]
-        
-        if not borough_env.empty:
-            user_data['Avg_PM25'] = borough_env['Avg_PM25'].iloc[0]
-            user_data['Avg_NO2'] = borough_env['Avg_NO2'].iloc[0]
-            user_data['NoiseLevel_dB'] = borough_env['NoiseLevel_dB'].iloc[0]
-            user_data['GreenSpacePercent'] = borough_env['GreenSpacePercent'].iloc[0]
-            user_data['WalkabilityScore'] = borough_env['WalkabilityScore'].iloc[0]
-            user_data['UrbanHeatIncrease'] = borough_env['UrbanHeatIncrease'].iloc[0]
-        else:
-            user_data['Avg_PM25'] = env_data['Avg_PM25'].mean()
-            user_data['Avg_NO2'] = env_data['Avg_NO2'].mean()
-            user_data['NoiseLevel_dB'] = env_data['NoiseLevel_dB'].mean()
-            user_data['GreenSpacePercent'] = env_data['GreenSpacePercent'].mean()
-            user_data['WalkabilityScore'] = env_data['WalkabilityScore'].mean()
-            user_data['UrbanHeatIncrease'] = env_data['UrbanHeatIncrease'].mean()
+        # Join environmental data for the borough
+        with span('env_join'):
+            env_index.apply(user_data)
         
         # Make prediction
-        result = model.predict_risk(user_data)
+        with span('predict'):
+            result = scorer.predict_risk(user_data)
         
         # Add environmental data to result
         result['environmental_data'] = {
@@ -72,10 +75,12 @@ def assess_risk():
         result['llm_advice'] = get_simple_advice(result['risk_level'], user_data['Borough'])
         result['llm_available'] = False  # Using fallback
         
-        return jsonify({
-            'success': True,
-            'result': result
-        })
+        with span('serialize'):
+            response = jsonify({
+                'success': True,
+                'result': result
+            })
+        return response
         
     except Exception as e:
         return jsonify({
@@ -0,0 +1,39 @@
+import os
+import time
+
+from advice_cache import AdviceCache
+
+
+def test_puts_are_saved_in_one_deferred_write(tmp_path):
+    path = str(tmp_path / 'advice.json')
+    cache = AdviceCache(max_size=8, path=path, save_interval=0.2)
+    for i in range(5):
+        cache.put(f'key{i}', f'advice {i}')
+    assert not os.path.exists(path)
+
+    time.sleep(0.5)
+    assert os.path.exists(path)
+    restored = AdviceCache(max_size=8, path=path)
+    assert restored.get('key4') == 'advice 4'
+    assert restored.stats()['size'] == 5
+
+
+def test_flush_saves_pending_changes(tmp_path):
+    path = str(tmp_path / 'advice.json')
+    cache = AdviceCache(max_size=2, path=path, save_interval=60)
+    for i in range(3):
+        cache.put(f'key{i}', f'advice {i}')
+    cache.flush()
+
+    restored = AdviceCache(max_size=2, path=path)
+    assert restored.get('key0') is None
+    assert restored.get('key2') == 'advice 2'
+
+
+def test_expired_entries_are_not_restored(tmp_path):
+    path = str(tmp_path / 'advice.json')
+    cache = AdviceCache(ttl=0.1, path=path, save_interval=60)
+    cache.put('key', 'advice')
+    cache.flush()
+    time.sleep(0.2)
+    assert AdviceCache(ttl=0.1, path=path).get('key') is None
@@ -0,0 +1,95 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from flask import Flask
+
+from batch_assessment import (INPUT_COLUMNS, MISSING_CATEGORY, BatchValidationError, register_batch_endpoint,
+                              score_batch, validate_batch)
+from data_processor import CVDDataProcessor
+from environment_index import BoroughEnvironmentIndex
+from ml_model import CVDRiskModel
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEALTH_DATA = os.path.join(ROOT, 'user_data', 'expanded_health_data.csv')
+ENV_DATA = os.path.join(ROOT, 'environmental_data', 'expanded_environmental_data.csv')
+
+
+@pytest.fixture(scope='module')
+def model():
+    model = CVDRiskModel(model_params={'n_estimators': 20})
+    model.data_processor = CVDDataProcessor(HEALTH_DATA, ENV_DATA)
+    model.data_processor.dataset_cache_dir = None
+    model.train_model(cv=2, n_jobs=1)
+    return model
+
+
+@pytest.fixture
+def records():
+    return pd.read_csv(HEALTH_DATA, nrows=40).drop(columns='CVD_Risk')
+
+
+def category_codes(model):
+    return model.data_processor.get_compiled_encoder().category_codes
+
+
+def test_valid_batch_is_cleaned(model, records):
+    records['id'] = np.arange(len(records)) + 100
+    clean = validate_batch(records, category_codes(model))
+    assert list(clean.columns) == ['id'] + INPUT_COLUMNS
+    assert len(clean) == len(records)
+    # Missing alcohol consumption becomes the category training saw for blank cells
+    assert (clean['AlcoholConsumption'][records['AlcoholConsumption'].isna()] == MISSING_CATEGORY).all()
+
+
+def test_every_invalid_cell_is_reported(model, records):
+    records.loc[3, 'Age'] = 200
+    records['SystolicBP'] = records['SystolicBP'].astype(object)
+    records.loc[5, 'SystolicBP'] = 'high'
+    records.loc[5, 'Borough'] = 'Atlantis'
+    with pytest.raises(BatchValidationError) as excinfo:
+        validate_batch(records, category_codes(model))
+    assert str(excinfo.value).startswith('3 invalid values in 2 records')
+    assert [(e['row'], e['column']) for e in excinfo.value.errors] == [
+        (3, 'Age'), (5, 'Borough'), (5, 'SystolicBP')
+    ]
+
+
+def test_missing_columns_are_rejected(model, records):
+    with pytest.raises(BatchValidationError, match='Missing columns: BMI'):
+        validate_batch(records.drop(columns='BMI'), category_codes(model))
+
+
+def test_empty_batch_is_rejected(model, records):
+    with pytest.raises(BatchValidationError, match='no records'):
+        validate_batch(records.iloc[:0], category_codes(model))
+
+
+def test_batch_scores_match_single_predictions(model, records):
+    env_index = BoroughEnvironmentIndex(ENV_DATA)
+    records = records[records['AlcoholConsumption'].notna()].reset_index(drop=True)
+    results = score_batch(model, env_index, validate_batch(records, category_codes(model)))
+
+    for i, row in records.iterrows():
+        single = model.predict_risk(env_index.apply(row.to_dict()))
+        assert results['risk_prediction'][i] == single['risk_prediction']
+        assert results['risk_probability'][i] == pytest.approx(single['risk_probability'], abs=1e-12)
+        assert results['risk_level'][i] == single['risk_level']
+
+
+def test_endpoint_separates_client_and_server_errors(model, records, monkeypatch):
+    app = Flask(__name__)
+    register_batch_endpoint(app, model, BoroughEnvironmentIndex(ENV_DATA))
+    client = app.test_client()
+
+    response = client.post('/assess_risk/batch', data=b'Age,BMI\n"40,2', content_type='text/csv')
+    assert response.status_code == 400 and not response.get_json()['success']
+    response = client.post('/assess_risk/batch', data=records.to_csv(index=False), content_type='text/csv')
+    assert response.status_code == 200 and response.headers['X-Batch-Rows'] == str(len(records))
+
+    def broken_model(frame):
+        raise RuntimeError("model crashed")
+    monkeypatch.setattr(model, 'predict_risk_batch', broken_model)
+    response = client.post('/assess_risk/batch', data=records.to_csv(index=False), content_type='text/csv')
+    assert response.status_code == 500
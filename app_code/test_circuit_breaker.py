@@ -0,0 +1,73 @@
+from circuit_breaker import CircuitBreaker
+from llm_advisor import CVDLlamaAdvisor
+
+
+def open_breaker(breaker):
+    for _ in range(breaker.failure_threshold):
+        assert breaker.allow_request()
+        breaker.record(False, 0.1)
+
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, probe_interval=60)
+    breaker.record(False, 0.1)
+    breaker.record(True, 0.1)
+    breaker.record(False, 0.1)
+    breaker.record(False, 0.1)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.record(False, 0.1)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+    assert breaker.rejected == 1
+
+
+def test_slow_calls_count_as_failures():
+    breaker = CircuitBreaker(failure_threshold=2, slow_call_seconds=1.0, probe_interval=60)
+    breaker.record(True, 5.0)
+    breaker.record(True, 5.0)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_half_open_admits_one_trial():
+    breaker = CircuitBreaker(failure_threshold=1, probe_interval=0)
+    open_breaker(breaker)
+    assert breaker.allow_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow_request()
+
+    breaker.record(True, 0.1)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request() and breaker.allow_request()
+
+
+def test_failed_trial_reopens():
+    breaker = CircuitBreaker(failure_threshold=1, probe_interval=0)
+    open_breaker(breaker)
+    assert breaker.allow_request()
+    breaker.record(False, 0.1)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.times_opened == 2
+
+
+def test_cancel_gives_back_the_trial():
+    breaker = CircuitBreaker(failure_threshold=1, probe_interval=0)
+    open_breaker(breaker)
+    assert breaker.allow_request()
+    breaker.cancel()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request()
+
+
+def test_advice_error_releases_the_trial():
+    advisor = CVDLlamaAdvisor(cache_size=0)
+    advisor.breaker = CircuitBreaker(failure_threshold=1, probe_interval=0)
+    open_breaker(advisor.breaker)
+
+    def broken_prompt(*args):
+        raise KeyError('Avg_PM25')
+    advisor._build_advice_prompt = broken_prompt
+
+    # Falls back to the rule-based text, and the next call may try Ollama again
+    assert advisor.get_environmental_advice('High', {}, {})
+    assert advisor.breaker.allow_request()
@@ -0,0 +1,68 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+import dataset_cache
+from data_processor import CVDDataProcessor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEALTH_DATA = os.path.join(ROOT, 'user_data', 'expanded_health_data.csv')
+ENV_DATA = os.path.join(ROOT, 'environmental_data', 'expanded_environmental_data.csv')
+
+
+@pytest.fixture
+def sources(tmp_path):
+    health = shutil.copy(HEALTH_DATA, tmp_path / 'health.csv')
+    env = shutil.copy(ENV_DATA, tmp_path / 'env.csv')
+    return str(health), str(env)
+
+
+def processor(sources, cache_dir):
+    data_processor = CVDDataProcessor(*sources)
+    data_processor.dataset_cache_dir = str(cache_dir)
+    return data_processor
+
+
+def test_cached_dataset_matches_a_fresh_load(sources, tmp_path):
+    fresh = processor(sources, tmp_path / 'cache')
+    X, y = fresh.load_training_data()
+    assert len(os.listdir(tmp_path / 'cache')) == 1
+
+    cached = processor(sources, tmp_path / 'cache')
+    X_cached, y_cached = cached.load_training_data()
+    assert isinstance(X_cached, np.memmap)
+    assert np.array_equal(X_cached, X) and np.array_equal(y_cached, y)
+
+    # The restored encoders and scaler encode new rows exactly like the fitted ones
+    user_input = {'Age': 55, 'Gender': 'Female', 'Smoker': 'No', 'FamilyHistoryCVD': 'Yes', 'Diabetes': 'No',
+                  'HighBloodPressure': 'Yes', 'BMI': 27.5, 'TotalCholesterol': 230, 'SystolicBP': 145,
+                  'DiastolicBP': 90, 'PhysicalActivityLevel': 'Low', 'AlcoholConsumption': 'Light',
+                  'StressLevel': 'High', 'SleepHours': 6.5, 'Borough': 'Camden', 'Avg_PM25': 12.0,
+                  'Avg_NO2': 35.0, 'NoiseLevel_dB': 60.0, 'GreenSpacePercent': 25.0,
+                  'WalkabilityScore': 80.0, 'UrbanHeatIncrease': 1.5}
+    assert np.array_equal(cached.prepare_single_prediction(user_input), fresh.prepare_single_prediction(user_input))
+
+
+def test_editing_a_source_changes_the_key(sources):
+    key = dataset_cache.dataset_key(sources, 'full')
+    assert dataset_cache.dataset_key(sources, 'streaming') != key
+    with open(sources[0], 'a', encoding='utf-8') as f:
+        f.write("40,Male,No,No,No,No,24.0,180.0,120.0,80.0,High,Light,Low,7.5,Camden,0\n")
+    assert dataset_cache.dataset_key(sources, 'full') != key
+
+
+def test_only_the_newest_entries_are_kept(sources, tmp_path):
+    data_processor = processor(sources, tmp_path)
+    data_processor.dataset_cache_dir = None
+    X, y = data_processor.load_training_data()
+    cache_dir = tmp_path / 'cache'
+    cache_dir.mkdir()
+    for i in range(dataset_cache.MAX_CACHED_DATASETS + 2):
+        entry = cache_dir / f"entry{i}"
+        dataset_cache.save_dataset(str(entry), X, y, data_processor, sources)
+        # Distinct, increasing mtimes regardless of the filesystem's timestamp resolution
+        os.utime(entry, (1e9 + i, 1e9 + i))
+    kept = sorted(name for name in os.listdir(cache_dir) if dataset_cache.has_dataset(cache_dir / name))
+    assert kept == ['entry2', 'entry3', 'entry4']
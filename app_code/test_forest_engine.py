@@ -0,0 +1,56 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from sklearn.datasets import make_classification
+from sklearn.ensemble import RandomForestClassifier
+
+from forest_engine import FlatForest, flatten_forest
+
+
+@pytest.fixture(scope='module')
+def fitted():
+    X, y = make_classification(n_samples=600, n_features=21, random_state=0)
+    forest = RandomForestClassifier(n_estimators=25, max_depth=15, min_samples_split=3,
+                                    min_samples_leaf=2, class_weight='balanced', random_state=42)
+    forest.fit(X[:400], y[:400])
+    return forest, X[400:]
+
+
+def test_batch_matches_sklearn(fitted):
+    forest, X = fitted
+    assert np.array_equal(FlatForest.from_sklearn(forest).predict_proba(X), forest.predict_proba(X))
+
+
+def test_single_rows_match_sklearn(fitted):
+    forest, X = fitted
+    engine = FlatForest.from_sklearn(forest)
+    for row in X[:50]:
+        assert np.array_equal(engine.predict_proba(row), forest.predict_proba(row.reshape(1, -1)))
+
+
+def test_blocks_match_sklearn(fitted):
+    forest, X = fitted
+    engine = FlatForest.from_sklearn(forest, block_size=7)
+    assert np.array_equal(engine.predict_proba(X), forest.predict_proba(X))
+
+
+def test_predict_matches_sklearn(fitted):
+    forest, X = fitted
+    assert np.array_equal(FlatForest.from_sklearn(forest).predict(X), forest.predict(X))
+
+
+def test_count_valued_trees_are_normalized(fitted):
+    # scikit-learn < 1.4 stored class counts in tree_.value rather than probabilities
+    forest, X = fitted
+    old_style = SimpleNamespace(estimators_=[], classes_=forest.classes_)
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+        counts = tree.value * tree.weighted_n_node_samples[:, None, None]
+        old_style.estimators_.append(SimpleNamespace(tree_=SimpleNamespace(
+            children_left=tree.children_left, children_right=tree.children_right,
+            feature=tree.feature, threshold=tree.threshold, value=counts, node_count=tree.node_count
+        )))
+
+    engine = FlatForest(flatten_forest(old_style), forest.classes_)
+    np.testing.assert_allclose(engine.predict_proba(X), forest.predict_proba(X), rtol=0, atol=1e-12)
@@ -0,0 +1,92 @@
+import json
+import threading
+import time
+import http.server
+
+import pytest
+
+from advice_jobs import AdviceJobManager
+from llm_advisor import CVDLlamaAdvisor
+
+TOKENS = ["Walk ", "in ", "green ", "spaces ", "away ", "from ", "busy ", "roads, ", "ideally ", "early ", "in ",
+          "the ", "morning."]
+ENV_DATA = {'borough': 'Camden', 'pm25': 12.0, 'no2': 35.0}
+
+
+class StreamingOllama(http.server.BaseHTTPRequestHandler):
+    """Streams TOKENS; with stall_after set, goes silent after that many tokens"""
+
+    protocol_version = 'HTTP/1.1'
+    stall_after = None
+    token_interval = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for i, token in enumerate(TOKENS):
+            if i == self.stall_after:
+                time.sleep(1.0)
+                self.close_connection = True
+                return
+            self._write_chunk({'response': token, 'done': False})
+            time.sleep(self.token_interval)
+        self._write_chunk({'response': '', 'done': True})
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, body):
+        data = (json.dumps(body) + "\n").encode()
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+@pytest.fixture
+def ollama_url():
+    StreamingOllama.stall_after = None
+    StreamingOllama.token_interval = 0.0
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), StreamingOllama)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+def stream(advisor):
+    events = list(advisor.stream_environmental_advice('High Risk', ENV_DATA, {'age': 60}))
+    return events[:-1], events[-1]
+
+
+def test_complete_stream_is_cached(ollama_url):
+    advisor = CVDLlamaAdvisor(base_url=ollama_url, timeout=0.5, cache_size=16)
+    tokens, final = stream(advisor)
+    assert len(tokens) == len(TOKENS)
+    assert final['llm_available'] and final['advice'].endswith('morning.')
+    assert advisor.get_cached_advice('High Risk', ENV_DATA, {'age': 60}) == final['advice']
+    assert advisor.breaker.consecutive_failures == 0
+
+
+def test_stalled_stream_falls_back(ollama_url):
+    StreamingOllama.stall_after = 12
+    advisor = CVDLlamaAdvisor(base_url=ollama_url, timeout=0.5, cache_size=16)
+    tokens, final = stream(advisor)
+    assert len(tokens) == 12
+    assert not final['llm_available']
+    assert final['advice'] == advisor.get_fallback_advice('High Risk', ENV_DATA)
+    assert advisor.get_cached_advice('High Risk', ENV_DATA, {'age': 60}) is None
+    assert advisor.breaker.consecutive_failures == 1
+
+
+def test_background_jobs_wait_for_a_generation_slot(ollama_url):
+    # Each generation holds a slot for ~0.5s, longer than the interactive queue_timeout
+    StreamingOllama.token_interval = 0.04
+    advisor = CVDLlamaAdvisor(base_url=ollama_url, timeout=2, cache_size=16, max_concurrent=2)
+    jobs = AdviceJobManager(advisor, max_workers=4)
+    submitted = [jobs.submit('High Risk', ENV_DATA, {'age': 60 + i}) for i in range(4)]
+
+    finals = [list(jobs.iter_events(job, timeout=5))[-1] for job in submitted]
+    assert all(final['llm_available'] for final in finals)
+    assert advisor.breaker.consecutive_failures == 0
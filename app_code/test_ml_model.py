@@ -0,0 +1,75 @@
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from environment_index import BoroughEnvironmentIndex
+from ml_model import ENGINE_MAX_BATCH_ROWS, CVDRiskModel, evaluate_model
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(APP_DIR)
+SHIPPED_MODEL = os.path.join(APP_DIR, 'cvd_risk_model.pkl')
+HEALTH_DATA = os.path.join(ROOT, 'user_data', 'expanded_health_data.csv')
+ENV_DATA = os.path.join(ROOT, 'environmental_data', 'expanded_environmental_data.csv')
+
+
+@pytest.fixture(scope='module')
+def shipped_model():
+    model = CVDRiskModel()
+    with warnings.catch_warnings():
+        # The shipped pickle was written by an older scikit-learn
+        warnings.simplefilter('ignore')
+        assert model.load_model(SHIPPED_MODEL, prefer_artifact=False)
+    return model
+
+
+@pytest.fixture(scope='module')
+def encoded_rows(shipped_model):
+    records = pd.read_csv(HEALTH_DATA, nrows=ENGINE_MAX_BATCH_ROWS + 64).drop(columns='CVD_Risk')
+    BoroughEnvironmentIndex(ENV_DATA).join(records)
+    return shipped_model.data_processor.prepare_batch_prediction(records)
+
+
+def test_large_batches_match_single_rows(shipped_model, encoded_rows):
+    # More rows than the flattened engine takes, so scikit-learn scores the batch
+    batch = shipped_model.predict_risk_rows(encoded_rows)
+    assert ((batch['risk_probability'] >= 0) & (batch['risk_probability'] <= 1)).all()
+
+    for i in range(len(encoded_rows)):
+        single = shipped_model.predict_risk_rows(encoded_rows[i:i + 1])
+        assert batch['risk_probability'][i] == single['risk_probability'][0]
+        assert batch['risk_prediction'][i] == single['risk_prediction'][0]
+        assert batch['risk_level'][i] == single['risk_level'][0]
+
+
+def test_engine_and_sklearn_agree_on_the_shipped_forest(shipped_model, encoded_rows):
+    engine = shipped_model._get_predictor(1)
+    assert np.array_equal(engine.predict_proba(encoded_rows), shipped_model.model.predict_proba(encoded_rows))
+
+
+def test_models_loaded_from_an_artifact_refuse_to_refresh(shipped_model, tmp_path):
+    artifact_path = str(tmp_path / 'cvd_risk_model.artifact')
+    shipped_model.save_artifact(artifact_path)
+    served = CVDRiskModel()
+    assert served.load_model(artifact_path)
+
+    records = pd.read_csv(HEALTH_DATA, nrows=200)
+    with pytest.raises(ValueError, match='prefer_artifact=False'):
+        served.refresh_model(records)
+
+
+def test_evaluation_keeps_only_the_selected_fold_model():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(200, 4))
+    y = (X[:, 0] > 0).astype(int)
+    forest = RandomForestClassifier(n_estimators=5, random_state=0)
+
+    scores_only = evaluate_model(forest, X, y, cv=4, n_jobs=1)
+    assert 'model' not in scores_only and len(scores_only['cv_scores']) == 4
+
+    with_model = evaluate_model(forest, X, y, cv=4, n_jobs=1, keep_model=True)
+    assert isinstance(with_model['model'], RandomForestClassifier)
+    np.testing.assert_array_equal(with_model['oof_proba'], scores_only['oof_proba'])
@@ -0,0 +1,38 @@
+import numpy as np
+
+from prediction_cache import PredictionCache
+
+RESULT = {'risk_prediction': 1, 'risk_probability': 0.8, 'risk_level': 'High'}
+
+
+def test_equal_rows_share_a_key():
+    assert PredictionCache.key_for(np.array([0.0, 1.5])) == PredictionCache.key_for(np.array([-0.0, 1.5]))
+    assert PredictionCache.key_for(np.array([0.0, 1.5])) != PredictionCache.key_for(np.array([0.0, 1.25]))
+
+
+def test_hit_returns_a_copy():
+    cache = PredictionCache()
+    cache.put(b'a', 1, RESULT)
+    hit = cache.get(b'a', 1)
+    assert hit == RESULT
+    hit['environmental_data'] = {}
+    assert cache.get(b'a', 1) == RESULT
+    assert cache.get(b'b', 1) is None
+    assert cache.stats()['hits'] == 2 and cache.stats()['misses'] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = PredictionCache(max_size=2)
+    cache.put(b'a', 1, RESULT)
+    cache.put(b'b', 1, RESULT)
+    cache.get(b'a', 1)
+    cache.put(b'c', 1, RESULT)
+    assert cache.get(b'b', 1) is None
+    assert cache.get(b'a', 1) is not None and cache.get(b'c', 1) is not None
+
+
+def test_new_model_version_empties_the_cache():
+    cache = PredictionCache()
+    cache.put(b'a', 1, RESULT)
+    assert cache.get(b'a', 2) is None
+    assert cache.stats()['size'] == 0 and cache.stats()['invalidations'] == 1
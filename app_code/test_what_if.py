@@ -0,0 +1,160 @@
+import os
+import warnings
+
+import pandas as pd
+import pytest
+from flask import Flask
+
+from batch_assessment import BatchValidationError
+from data_processor import CVDDataProcessor
+from environment_index import BoroughEnvironmentIndex
+from ml_model import ENGINE_MAX_BATCH_ROWS, CVDRiskModel
+from what_if import VariantEncoder, parse_interventions, register_what_if_endpoint, score_what_if
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(APP_DIR)
+SHIPPED_MODEL = os.path.join(APP_DIR, 'cvd_risk_model.pkl')
+HEALTH_DATA = os.path.join(ROOT, 'user_data', 'expanded_health_data.csv')
+ENV_DATA = os.path.join(ROOT, 'environmental_data', 'expanded_environmental_data.csv')
+
+INTERVENTIONS = [
+    {'name': 'Quit smoking', 'set': {'Smoker': 'No'}},
+    {'name': 'Lose weight', 'adjust': {'BMI': -3}},
+    {'name': 'Move', 'set': {'Borough': 'Richmond upon Thames'}}
+]
+
+
+@pytest.fixture(scope='module')
+def model():
+    model = CVDRiskModel(model_params={'n_estimators': 20})
+    model.data_processor = CVDDataProcessor(HEALTH_DATA, ENV_DATA)
+    model.data_processor.dataset_cache_dir = None
+    model.train_model(cv=2, n_jobs=1)
+    return model
+
+
+@pytest.fixture(scope='module')
+def shipped_model():
+    model = CVDRiskModel()
+    with warnings.catch_warnings():
+        # The shipped pickle was written by an older scikit-learn
+        warnings.simplefilter('ignore')
+        assert model.load_model(SHIPPED_MODEL, prefer_artifact=False)
+    return model
+
+
+@pytest.fixture(scope='module')
+def env_index():
+    return BoroughEnvironmentIndex(ENV_DATA)
+
+
+@pytest.fixture
+def profile():
+    records = pd.read_csv(HEALTH_DATA, nrows=40).drop(columns='CVD_Risk')
+    row = records[records['AlcoholConsumption'].notna()].iloc[0].to_dict()
+    row.update({'Smoker': 'Yes', 'BMI': 31.0, 'Borough': 'Newham'})
+    return row
+
+
+def predict(model, env_index, profile, set_values=None, adjustments=None):
+    """Score a modified copy of profile through the single-row path"""
+    patient = {**profile, **(set_values or {})}
+    for col, amount in (adjustments or {}).items():
+        patient[col] += amount
+    return model.predict_risk(env_index.apply(patient))
+
+
+def test_expand_builds_every_combination(model, env_index, profile):
+    encoder = VariantEncoder(model, env_index)
+    interventions = parse_interventions(INTERVENTIONS)
+    R, applied = encoder.expand(profile, interventions, 'all')
+    assert R.shape[0] == applied.shape[0] == 8
+    assert not applied[0].any() and applied[-1].all()
+
+    R, applied = encoder.expand(profile, interventions, 'single', boroughs=['Camden', 'Barnet'])
+    assert R.shape[0] == 6
+    assert applied.shape == (4, 3) and (applied.sum(axis=1) == [0, 1, 1, 1]).all()
+
+
+def test_variants_match_single_predictions(model, env_index, profile):
+    result = score_what_if(model, env_index, profile, parse_interventions(INTERVENTIONS))
+    baseline = predict(model, env_index, profile)
+    assert result['baseline']['risk_probability'] == pytest.approx(baseline['risk_probability'], abs=1e-12)
+    assert len(result['variants']) == 7
+
+    by_name = {spec['name']: spec for spec in INTERVENTIONS}
+    for variant in result['variants']:
+        set_values, adjustments = {}, {}
+        for name in variant['interventions']:
+            set_values.update(by_name[name].get('set', {}))
+            adjustments.update(by_name[name].get('adjust', {}))
+        expected = predict(model, env_index, profile, set_values, adjustments)
+        assert variant['risk_probability'] == pytest.approx(expected['risk_probability'], abs=1e-12)
+        assert variant['delta'] == pytest.approx(expected['risk_probability'] - baseline['risk_probability'],
+                                                 abs=1e-12)
+
+
+def test_large_requests_match_single_predictions(shipped_model, env_index, profile):
+    # 2**9 distinct variants: more rows than the flattened engine takes, scored by the shipped forest
+    specs = [{'name': col, 'adjust': {col: amount}} for col, amount in
+             [('Age', 1), ('BMI', -1), ('TotalCholesterol', -10), ('SystolicBP', -5), ('DiastolicBP', -3),
+              ('SleepHours', 1)]]
+    specs += [{'name': col, 'set': {col: value}} for col, value in
+              [('Smoker', 'No'), ('PhysicalActivityLevel', 'High'), ('StressLevel', 'Low')]]
+    result = score_what_if(shipped_model, env_index, profile, parse_interventions(specs))
+    assert result['scored_rows'] == 512 > ENGINE_MAX_BATCH_ROWS
+
+    by_name = {spec['name']: spec for spec in specs}
+    for variant in result['variants']:
+        set_values, adjustments = {}, {}
+        for name in variant['interventions']:
+            set_values.update(by_name[name].get('set', {}))
+            adjustments.update(by_name[name].get('adjust', {}))
+        expected = predict(shipped_model, env_index, profile, set_values, adjustments)
+        assert variant['risk_probability'] == pytest.approx(expected['risk_probability'], abs=1e-12)
+        assert variant['risk_level'] == expected['risk_level']
+
+
+def test_borough_comparison_scores_every_borough(model, env_index, profile):
+    result = score_what_if(model, env_index, profile, parse_interventions(INTERVENTIONS[:1]),
+                           'single', compare_boroughs=True)
+    assert sorted(entry['borough'] for entry in result['boroughs']) == sorted(env_index.boroughs())
+    for entry in result['boroughs'][:5]:
+        expected = predict(model, env_index, profile, {'Borough': entry['borough']})
+        assert entry['risk_probability'] == pytest.approx(expected['risk_probability'], abs=1e-12)
+
+
+def test_identical_variants_are_scored_once(model, env_index, profile):
+    interventions = parse_interventions([{'set': {'Smoker': 'Yes'}}, {'adjust': {'Age': 1}}])
+    result = score_what_if(model, env_index, profile, interventions)
+    assert result['variant_rows'] == 4
+    assert result['scored_rows'] == 2
+
+
+def test_out_of_range_variants_are_rejected(model, env_index, profile):
+    interventions = parse_interventions([{'adjust': {'BMI': -25}}])
+    with pytest.raises(BatchValidationError) as excinfo:
+        score_what_if(model, env_index, profile, interventions)
+    assert excinfo.value.errors == [{'row': 1, 'column': 'BMI', 'error': 'must be a number between 10 and 80'}]
+
+
+def test_invalid_interventions_are_rejected():
+    with pytest.raises(BatchValidationError, match='cannot change: Borough'):
+        parse_interventions([{'adjust': {'Borough': 1}}])
+    with pytest.raises(BatchValidationError, match="needs a 'set' and/or 'adjust'"):
+        parse_interventions([{'name': 'nothing'}])
+
+
+def test_endpoint_separates_client_and_server_errors(model, env_index, profile, monkeypatch):
+    app = Flask(__name__)
+    register_what_if_endpoint(app, model, env_index)
+    client = app.test_client()
+
+    response = client.post('/assess_risk/what_if', json={'profile': profile, 'interventions': [{'name': 'x'}]})
+    assert response.status_code == 400 and not response.get_json()['success']
+
+    def broken_model(X_input):
+        raise RuntimeError("model crashed")
+    monkeypatch.setattr(model, 'predict_risk_rows', broken_model)
+    response = client.post('/assess_risk/what_if', json={'profile': profile, 'interventions': INTERVENTIONS})
+    assert response.status_code == 500
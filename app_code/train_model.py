@@ -1,36 +1,54 @@
-from ml_model import CVDRiskModel
+from training_orchestrator import TrainingOrchestrator
+import argparse
 import sys
 
-def main():
+def search(args):
+    from hyperparameter_search import HyperparameterSearch
+
+    # Successive-halving search; keeps the fastest model meeting the accuracy bar
+    best_model, leaderboard = HyperparameterSearch(
+        cv=args.cv, min_accuracy=args.min_accuracy, finalists=args.finalists
+    ).run(args.leaderboard)
+
+    print(f"\n{'model':<22}{'CV accuracy':>14}{'p50 ms':>10}{'rows/s':>12}  params")
+    for entry in leaderboard:
+        marker = '*' if entry['selected'] else ('' if entry['meets_accuracy_bar'] else '-')
+        print(f"{marker:1}{entry['model_type']:<21}{entry['cv_mean']:>14.4f}{entry['latency_p50_ms']:>10.3f}"
+              f"{entry['batch_rows_per_s']:>12.0f}  {entry['model_params']}")
+    return best_model
+
+def main(argv=()):
+    # Callers such as run_web_app.py call main() with their own command line in sys.argv
+    parser = argparse.ArgumentParser(description='Train the CVD risk model')
+    parser.add_argument('--search', action='store_true',
+                        help='Run a hyperparameter search instead of comparing the default configurations')
+    parser.add_argument('--cv', type=int, default=5, help='Cross-validation folds')
+    parser.add_argument('--min-accuracy', type=float,
+                        help='CV accuracy bar for --search (default: best score minus 0.01)')
+    parser.add_argument('--finalists', type=int, default=3, help='Final-round candidates timed per model family')
+    parser.add_argument('--leaderboard', default='search_leaderboard.json', help='JSON leaderboard for --search')
+    args = parser.parse_args(list(argv))
+
     print("Training CVD Risk Assessment Model...")
     print("=" * 50)
-    
-    # Try both model types and select the best one
-    models = ['random_forest', 'logistic_regression']
-    best_model = None
-    best_accuracy = 0
-    
-    for model_type in models:
-        print(f"\nTraining {model_type.replace('_', ' ').title()} model...")
-        model = CVDRiskModel(model_type=model_type)
-        
-        try:
-            accuracy, cv_scores = model.train_model()
-            
-            if accuracy > best_accuracy:
-                best_accuracy = accuracy
-                best_model = model
-                best_model_type = model_type
-        
-        except Exception as e:
-            print(f"Error training {model_type}: {str(e)}")
-            continue
-    
+
+    if args.search:
+        best_model = search(args)
+    else:
+        # Train both model types in parallel and select the best cross-validated one
+        orchestrator = TrainingOrchestrator(cv=args.cv)
+        best_model, results = orchestrator.run()
+
+        if best_model:
+            best_result = max((r for r in results if 'error' not in r), key=lambda r: r['cv_mean'])
+            print(f"\n{'='*50}")
+            print(f"Best model: {best_model.model_type.replace('_', ' ').title()}")
+            print(f"Best CV accuracy: {best_result['cv_mean']:.4f}")
+            print(f"Test Accuracy (out-of-fold): {best_result['accuracy']:.4f}")
+            print("\nClassification Report:")
+            print(best_result['classification_report'])
+
     if best_model:
-        print(f"\n{'='*50}")
-        print(f"Best model: {best_model_type.replace('_', ' ').title()}")
-        print(f"Best accuracy: {best_accuracy:.4f}")
-        
         # Save the best model
         best_model.save_model('cvd_risk_model.pkl')
         print("\nModel training completed successfully!")
@@ -40,4 +58,4 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main(sys.argv[1:])
@@ -1,8 +1,14 @@
 import os
-from flask import Flask, render_template, request, jsonify
-import pandas as pd
+from flask import Flask, render_template, request, jsonify, Response
 from ml_model import CVDRiskModel
+from environment_index import BoroughEnvironmentIndex
+from health_checks import register_health_endpoints
+from micro_batcher import MicroBatchScorer
+from instrumentation import span, register_metrics
+from batch_assessment import register_batch_endpoint
+from what_if import register_what_if_endpoint
 from llm_advisor import CVDLlamaAdvisor
+from advice_jobs import AdviceJobManager, format_sse
 import traceback
 
 app = Flask(__name__)
@@ -12,9 +18,19 @@ model = CVDRiskModel()
 if not model.load_model():
     print("Warning: Model not found. Please train the model first.")
 
+# Optionally coalesce concurrent predictions into batches (CVD_MICROBATCH=1)
+batcher = MicroBatchScorer.from_env(model)
+scorer = batcher or model
+
+# Borough environmental data, loaded once and reloaded when the CSV changes
+env_index = BoroughEnvironmentIndex()
+register_health_endpoints(app, model, env_index, batcher)
+register_metrics(app)
+
 # Initialize LLM advisor if available
 try:
     llm_advisor = CVDLlamaAdvisor()
+    advice_jobs = AdviceJobManager(llm_advisor)
     LLM_AVAILABLE = True
     ollama_status = llm_advisor.check_ollama_availability()
     if ollama_status:
@@ -26,6 +42,12 @@ except Exception as e:
     LLM_AVAILABLE = False
     ollama_status = False
 
+# Bulk scoring for clinic uploads; advice is queued or rule-based, never awaited
+register_batch_endpoint(app, model, env_index,
+                        llm_advisor if LLM_AVAILABLE else None,
+                        advice_jobs if LLM_AVAILABLE else None)
+register_what_if_endpoint(app, model, env_index)
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -33,45 +55,31 @@ def index():
 @app.route('/assess_risk', methods=['POST'])
 def assess_risk():
     try:
-        user_data = {
-            'Age': int(request.form['age']),
-            'Gender': request.form['gender'],
-            'Smoker': request.form['smoker'],
-            'FamilyHistoryCVD': request.form['family_history'],
-            'Diabetes': request.form['diabetes'],
-            'HighBloodPressure': request.form['high_bp'],
-            'PhysicalActivityLevel': request.form['activity'],
-            'BMI': float(request.form['bmi']),
-            'TotalCholesterol': float(request.form['cholesterol']),
-            'SystolicBP': float(request.form['systolic_bp']),
-            'DiastolicBP': float(request.form['diastolic_bp']),
-            'AlcoholConsumption': request.form['alcohol'],
-            'StressLevel': request.form['stress'],
-            'SleepHours': float(request.form['sleep_hours']),
-            'Borough': request.form['borough']
-        }
-        
-        script_dir = os.path.dirname(os.path.realpath(__file__))
-        env_data_path = os.path.join(script_dir, '..', 'environmental_data', 'expanded_environmental_data.csv')
-        env_data = pd.read_csv(env_data_path)
-        borough_env = env_data[env_data['Borough'] == user_data['Borough']]
+        with span('parse_form'):
+            user_data = {
+                'Age': int(request.form['age']),
+                'Gender': request.form['gender'],
+                'Smoker': request.form['smoker'],
+                'FamilyHistoryCVD': request.form['family_history'],
+                'Diabetes': request.form['diabetes'],
+                'HighBloodPressure': request.form['high_bp'],
+                'PhysicalActivityLevel': request.form['activity'],
+                'BMI': float(request.form['bmi']),
+                'TotalCholesterol': float(request.form['cholesterol']),
+                'SystolicBP': float(request.form['systolic_bp']),
+                'DiastolicBP': float(request.form['diastolic_bp']),
+                'AlcoholConsumption': request.form['alcohol'],
+                'StressLevel': request.form['stress'],
+                'SleepHours': float(request.form['sleep_hours']),
+                'Borough': request.form['borough']
+            }
         
-        if not borough_env.empty:
-            user_data['Avg_PM25'] = borough_env['Avg_PM25'].iloc[0]
-            user_data['Avg_NO2'] = borough_env['Avg_NO2'].iloc[0]
-            user_data['NoiseLevel_dB'] = borough_env['NoiseLevel_dB'].iloc[0]
-            user_data['GreenSpacePercent'] = borough_env['GreenSpacePercent'].iloc[0]
-            user_data['WalkabilityScore'] = borough_env['WalkabilityScore'].iloc[0]
-            user_data['UrbanHeatIncrease'] = borough_env['UrbanHeatIncrease'].iloc[0]
-        else:
-            user_data['Avg_PM25'] = env_data['Avg_PM25'].mean()
-            user_data['Avg_NO2'] = env_data['Avg_NO2'].mean()
-            user_data['NoiseLevel_dB'] = env_data['NoiseLevel_dB'].mean()
-            user_data['GreenSpacePercent'] = env_data['GreenSpacePercent'].mean()
-            user_data['WalkabilityScore'] = env_data['WalkabilityScore'].mean()
-            user_data['UrbanHeatIncrease'] = env_data['UrbanHeatIncrease'].mean()
+        # Join environmental data for the borough
+        with span('env_join'):
+            env_index.apply(user_data)
         
-        result = model.predict_risk(user_data)
+        with span('predict'):
+            result = scorer.predict_risk(user_data)
         result['environmental_data'] = {
             'pm25': user_data['Avg_PM25'],
             'no2': user_data['Avg_NO2'],
@@ -79,29 +87,35 @@ def assess_risk():
         }
         result['recommendations'] = get_recommendations(result['risk_level'])
         
-        # Generate LLM-powered environmental advice
-        if LLM_AVAILABLE and ollama_status:
-            try:
-                advice = llm_advisor.get_environmental_advice(
-                    result['risk_level'], result['environmental_data'], user_data
-                )
-                print("Llama advice:", advice)
-                result['llm_advice'] = advice
-                result['llm_available'] = True
-            except Exception as e:
-                print("Llama error:", e)
-                traceback.print_exc()
-                advice = "Sorry, no advice available at this time."
-                result['llm_advice'] = advice
+        # Generate LLM-powered environmental advice in the background; the
+        # browser fetches it from /advice/<job_id> or its event stream
+        with span('advice'):
+            if LLM_AVAILABLE and llm_advisor.is_available():
+                try:
+                    job = advice_jobs.submit(
+                        result['risk_level'], result['environmental_data'], user_data
+                    )
+                    job_state = job.snapshot()
+                    result['advice_job_id'] = job.id
+                    result['llm_pending'] = job_state['status'] != 'done'
+                    result['llm_advice'] = job_state['llm_advice']
+                    result['llm_available'] = True
+                except Exception as e:
+                    print("Llama error:", e)
+                    traceback.print_exc()
+                    advice = "Sorry, no advice available at this time."
+                    result['llm_advice'] = advice
+                    result['llm_available'] = False
+            else:
+                result['llm_advice'] = None
                 result['llm_available'] = False
-        else:
-            result['llm_advice'] = None
-            result['llm_available'] = False
         
-        return jsonify({
-            'success': True,
-            'result': result
-        })
+        with span('serialize'):
+            response = jsonify({
+                'success': True,
+                'result': result
+            })
+        return response
         
     except Exception as e:
         print("Error in assess_risk:", e)
@@ -136,6 +150,31 @@ def get_recommendations(risk_level):
     }
     return recommendations.get(risk_level, ["Consult with healthcare provider"])
 
+@app.route('/advice/<job_id>', methods=['GET'])
+def advice_status(job_id):
+    job = advice_jobs.get(job_id) if LLM_AVAILABLE else None
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': 'Unknown advice job'
+        }), 404
+    return jsonify({
+        'success': True,
+        'result': job.snapshot()
+    })
+
+@app.route('/advice/<job_id>/stream', methods=['GET'])
+def advice_stream(job_id):
+    job = advice_jobs.get(job_id) if LLM_AVAILABLE else None
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': 'Unknown advice job'
+        }), 404
+    events = (format_sse(event) for event in advice_jobs.iter_events(job))
+    return Response(events, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/llm-status', methods=['GET'])
 def llm_status():
     if not LLM_AVAILABLE:
@@ -149,6 +188,7 @@ def llm_status():
         })
     try:
         model_info = llm_advisor.get_model_info()
+        model_info['cache'] = llm_advisor.get_cache_stats()
         return jsonify({
             'success': True,
             'status': model_info
@@ -166,7 +206,8 @@ if __name__ == '__main__':
     print("- http://localhost:5002")
     print("Press Ctrl+C to stop the server")
     try:
-        app.run(debug=True, host='127.0.0.1', port=5002)
+        # Development server only; use serve.py for production traffic
+        app.run(debug=os.environ.get('FLASK_DEBUG') == '1', host='127.0.0.1', port=5002)
     except Exception as e:
         print(f"Error starting server: {e}")
         print("Trying alternative configuration...")
@@ -0,0 +1,237 @@
+import numpy as np
+from flask import request, jsonify
+from batch_assessment import (INPUT_COLUMNS, NUMERIC_RANGES, MISSING_CATEGORY, MISSING_VALUES,
+                              MAX_REPORTED_ERRORS, BatchValidationError)
+from instrumentation import span
+
+# Rows scored per request: every variant, plus one per borough when compared
+MAX_WHAT_IF_VARIANTS = 4096
+
+def parse_interventions(specs):
+    """
+    Normalize intervention specs into (name, set values, adjustments) tuples
+
+    Each spec is an object with "set" (column -> new value) and/or "adjust"
+    (numeric column -> amount added), and an optional display "name".
+    """
+    if not isinstance(specs, list) or not all(isinstance(spec, dict) for spec in specs):
+        raise BatchValidationError("interventions must be a list of objects")
+
+    interventions = []
+    for i, spec in enumerate(specs):
+        set_values = spec.get('set') or {}
+        adjustments = spec.get('adjust') or {}
+        if not isinstance(set_values, dict) or not isinstance(adjustments, dict) or not (set_values or adjustments):
+            raise BatchValidationError(f"Intervention {i} needs a 'set' and/or 'adjust' object")
+
+        unknown = [col for col in set_values if col not in INPUT_COLUMNS]
+        unknown += [col for col in adjustments if col not in NUMERIC_RANGES]
+        if unknown:
+            raise BatchValidationError(f"Intervention {i} cannot change: {', '.join(unknown)}")
+        try:
+            # Numeric columns stay numeric so adjustments can stack on them
+            set_values = {col: float(value) if col in NUMERIC_RANGES else value
+                          for col, value in set_values.items()}
+            adjustments = {col: float(amount) for col, amount in adjustments.items()}
+        except (TypeError, ValueError):
+            raise BatchValidationError(f"Intervention {i} has a non-numeric value for a numeric column")
+
+        name = spec.get('name') or ", ".join(
+            [f"{col} = {value}" for col, value in set_values.items()]
+            + [f"{col} {amount:+g}" for col, amount in adjustments.items()]
+        )
+        interventions.append((str(name), set_values, adjustments))
+    return interventions
+
+def _category_code(col, value, category_codes):
+    """Label code for a categorical value, mapping missing values as the batch endpoint does"""
+    label = MISSING_CATEGORY if value in MISSING_VALUES else str(value)
+    if label not in category_codes[col]:
+        allowed = sorted('None' if c == MISSING_CATEGORY else c for c in category_codes[col])
+        raise BatchValidationError(f"{col} must be one of: {', '.join(allowed)}",
+                                   [{'row': 0, 'column': col, 'error': f"unknown value {value!r}"}])
+    return category_codes[col][label]
+
+class VariantEncoder:
+    """
+    Writes variants of one profile straight into the model's encoded feature matrix
+
+    The profile is encoded once; every intervention then only overwrites or
+    shifts the columns it touches, and a borough change also swaps in that
+    borough's environmental columns. No per-variant dicts or DataFrames are built.
+    """
+
+    def __init__(self, model, env_index):
+        self.encoder = model.data_processor.get_compiled_encoder()
+        self.env_index = env_index
+        self.columns = {feature: i for i, feature in enumerate(self.encoder.feature_columns)}
+
+    def _index(self, col):
+        return self.columns[col + '_encoded'] if col in self.encoder.category_codes else self.columns[col]
+
+    def _set(self, R, mask, col, value):
+        if col in NUMERIC_RANGES:
+            R[mask, self.columns[col]] = value
+            return
+        R[mask, self._index(col)] = _category_code(col, value, self.encoder.category_codes)
+        if col == 'Borough':
+            for env_col, env_value in self.env_index.lookup(value).items():
+                R[mask, self.columns[env_col]] = env_value
+
+    def expand(self, profile, interventions, mode='all', boroughs=()):
+        """
+        Build the unscaled feature matrix, baseline first
+
+        mode='all' applies every combination of interventions (2**n rows);
+        mode='single' applies each intervention on its own. Interventions apply
+        in order, so a later "set" on the same column wins and adjustments add
+        up. One extra row per borough in `boroughs` follows the variants.
+        Returns the matrix and the variant x intervention membership matrix.
+        """
+        if not isinstance(profile, dict):
+            raise BatchValidationError("profile must be an object of patient fields")
+        missing = [col for col in INPUT_COLUMNS if col not in profile]
+        if missing:
+            raise BatchValidationError(f"Missing columns: {', '.join(missing)}")
+
+        n = len(interventions)
+        if mode == 'all':
+            if 2 ** n + len(boroughs) > MAX_WHAT_IF_VARIANTS:
+                raise BatchValidationError(f"mode=all allows at most {MAX_WHAT_IF_VARIANTS} variants")
+            applied = ((np.arange(2 ** n)[:, None] >> np.arange(n)) & 1).astype(bool)
+        else:
+            if n + 1 + len(boroughs) > MAX_WHAT_IF_VARIANTS:
+                raise BatchValidationError(f"At most {MAX_WHAT_IF_VARIANTS} variants per request")
+            applied = np.vstack([np.zeros((1, n), dtype=bool), np.eye(n, dtype=bool)])
+
+        rows = len(applied) + len(boroughs)
+        R = np.empty((rows, len(self.columns)), dtype=np.float64)
+        everyone = np.ones(rows, dtype=bool)
+        for col in INPUT_COLUMNS:
+            value = profile[col]
+            if col in NUMERIC_RANGES:
+                try:
+                    value = float(value)
+                except (TypeError, ValueError):
+                    value = np.nan
+            self._set(R, everyone, col, value)
+
+        for j, (_, set_values, adjustments) in enumerate(interventions):
+            mask = np.zeros(rows, dtype=bool)
+            mask[:len(applied)] = applied[:, j]
+            for col, value in set_values.items():
+                self._set(R, mask, col, value)
+            for col, amount in adjustments.items():
+                R[mask, self.columns[col]] += amount
+
+        for k, borough in enumerate(boroughs):
+            row = np.zeros(rows, dtype=bool)
+            row[len(applied) + k] = True
+            self._set(R, row, 'Borough', borough)
+
+        # Same numeric bounds as /assess_risk/batch, checked on every variant
+        errors = []
+        for col, (low, high) in NUMERIC_RANGES.items():
+            values = R[:, self.columns[col]]
+            bad = np.isnan(values) | (values < low) | (values > high)
+            errors.extend({'row': int(row), 'column': col, 'error': f"must be a number between {low} and {high}"}
+                          for row in np.flatnonzero(bad))
+        if errors:
+            errors.sort(key=lambda error: (error['row'], error['column']))
+            raise BatchValidationError(
+                f"{len(errors)} invalid values in {len({error['row'] for error in errors})} variants",
+                errors[:MAX_REPORTED_ERRORS]
+            )
+        return R, applied
+
+def _prediction(results, i):
+    return {
+        'risk_prediction': int(results['risk_prediction'][i]),
+        'risk_probability': float(results['risk_probability'][i]),
+        'risk_level': results['risk_level'][i]
+    }
+
+def score_what_if(model, env_index, profile, interventions, mode='all', compare_boroughs=False):
+    """Score the baseline, every variant and optionally every borough in one model call"""
+    boroughs = env_index.boroughs() if compare_boroughs else []
+    encoder = VariantEncoder(model, env_index)
+    with span('batch_encode'):
+        R, applied = encoder.expand(profile, interventions, mode, boroughs)
+        X_input = encoder.encoder.scale_rows(R)
+    # Variants that end up identical (e.g. "quit smoking" for a non-smoker) are scored once
+    X_unique, inverse = np.unique(X_input, axis=0, return_inverse=True)
+    scored = model.predict_risk_rows(X_unique)
+    results = {key: np.asarray(values)[inverse.ravel()] for key, values in scored.items()}
+
+    deltas = results['risk_probability'] - results['risk_probability'][0]
+    names = [name for name, _, _ in interventions]
+
+    variants = []
+    for i in range(1, len(applied)):
+        variant = _prediction(results, i)
+        variant['interventions'] = [names[j] for j in np.flatnonzero(applied[i])]
+        variant['delta'] = float(deltas[i])
+        variants.append(variant)
+    variants.sort(key=lambda variant: variant['delta'])
+
+    # Effect of each intervention applied on its own
+    single_rows = {int(np.flatnonzero(applied[i])[0]): i
+                   for i in range(len(applied)) if applied[i].sum() == 1}
+    effects = [{'name': name, 'delta': float(deltas[single_rows[j]]),
+                'risk_probability': float(results['risk_probability'][single_rows[j]])}
+               for j, name in enumerate(names)]
+
+    response = {
+        'baseline': _prediction(results, 0),
+        'interventions': effects,
+        'variants': variants,
+        'variant_rows': len(X_input),
+        'scored_rows': len(X_unique)
+    }
+    if boroughs:
+        offset = len(applied)
+        response['boroughs'] = sorted(
+            ({'borough': borough, **_prediction(results, offset + k), 'delta': float(deltas[offset + k])}
+             for k, borough in enumerate(boroughs)),
+            key=lambda entry: entry['risk_probability']
+        )
+    return response
+
+def register_what_if_endpoint(app, model, env_index):
+    """
+    Add POST /assess_risk/what_if to a Flask app
+
+    JSON body:
+        profile           patient fields, as for /assess_risk/batch
+        interventions     list of {"name", "set": {...}, "adjust": {...}}
+        mode              all (default; every combination) or single
+        compare_boroughs  also score the profile in every borough
+    """
+
+    @app.route('/assess_risk/what_if', methods=['POST'])
+    def assess_risk_what_if():
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict):
+            return jsonify({'success': False, 'error': "Expected a JSON object"}), 400
+        mode = body.get('mode', 'all')
+        if mode not in ('all', 'single'):
+            return jsonify({'success': False, 'error': "mode must be all or single"}), 400
+
+        try:
+            interventions = parse_interventions(body.get('interventions', []))
+            result = score_what_if(model, env_index, body.get('profile'), interventions,
+                                   mode, bool(body.get('compare_boroughs')))
+        except BatchValidationError as e:
+            # Anything else is a server fault and surfaces as a 500
+            return jsonify({
+                'success': False,
+                'error': str(e),
+                'errors': e.errors
+            }), 400
+
+        with span('serialize'):
+            response = jsonify({
+                'success': True,
+                'result': result
+            })
+        return response
@@ -3,6 +3,10 @@ import numpy as np
 import random
 from datetime import datetime, timedelta
 
+# Synthetic records are drawn in blocks of this many rows, each from its own
+# SeedSequence child, so a cohort depends only on its size and seed
+HEALTH_BLOCK_ROWS = 10000
+
 class CVDDataCollector:
     def __init__(self):
         self.london_boroughs = [
@@ -110,25 +114,143 @@ class CVDDataCollector:
         
         return pd.DataFrame(data)
     
-    def collect_additional_environmental_data(self):
-        """Generate additional environmental factors"""
+    def generate_health_data_vectorized(self, num_records=500, seed=42):
+        """Vectorized generate_expanded_health_data: every column is drawn as a NumPy array"""
+        chunks = list(self.iter_health_data_chunks(num_records, max(num_records, 1), seed))
+        return chunks[0] if chunks else self._generate_health_chunk(np.random.default_rng(seed), 0)
+    
+    def iter_health_data_chunks(self, num_records, chunk_size=100000, seed=42):
+        """Yield the cohort as DataFrames of at most chunk_size rows
+        
+        Rows come from fixed HEALTH_BLOCK_ROWS blocks with spawned generators, so
+        the records are the same whatever chunk_size is.
+        """
+        seed_sequence = np.random.SeedSequence(seed)
+        # Blocks are only concatenated once a full chunk is waiting, so every row is copied
+        # a bounded number of times however many blocks a chunk spans
+        pending = []
+        pending_rows = 0
+        for start in range(0, num_records, HEALTH_BLOCK_ROWS):
+            rng = np.random.default_rng(seed_sequence.spawn(1)[0])
+            block = self._generate_health_chunk(rng, min(HEALTH_BLOCK_ROWS, num_records - start))
+            pending.append(block)
+            pending_rows += len(block)
+            if pending_rows < chunk_size:
+                continue
+            rows = pd.concat(pending, ignore_index=True) if len(pending) > 1 else pending[0]
+            offset = 0
+            while len(rows) - offset >= chunk_size:
+                yield rows.iloc[offset:offset + chunk_size].reset_index(drop=True)
+                offset += chunk_size
+            pending = [rows.iloc[offset:]] if offset < len(rows) else []
+            pending_rows = len(rows) - offset
+        if pending_rows:
+            yield pd.concat(pending, ignore_index=True)
+    
+    def save_health_data_chunked(self, path, num_records, chunk_size=100000, seed=42):
+        """Stream a synthetic cohort to CSV chunk by chunk, so it never has to fit in RAM"""
+        written = 0
+        for i, chunk in enumerate(self.iter_health_data_chunks(num_records, chunk_size, seed)):
+            chunk.to_csv(path, mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+            written += len(chunk)
+        print(f"✓ Saved {written} health records to {path}")
+        return written
+    
+    def _generate_health_chunk(self, rng, n):
+        """Draw n records with the same distributions as generate_expanded_health_data"""
+        age = rng.integers(18, 85, n)
+        gender = rng.choice(['Male', 'Female'], n)
+        
+        # Age-based risk adjustments
+        age_risk_factor = np.where(age < 45, 1.0, np.where(age < 65, 1.2, 1.5))
+        
+        # Generate correlated health factors
+        smoker = rng.random(n) < 0.2
+        family_history = rng.random(n) < 0.3
+        
+        # Age-correlated conditions
+        diabetes = rng.random(n) < np.minimum(0.15 * age_risk_factor, 0.4)
+        hypertension = rng.random(n) < np.minimum(0.2 * age_risk_factor, 0.5)
+        
+        # Additional health metrics
+        bmi = np.clip(rng.normal(26, 4, n), 18, 45)
+        cholesterol = np.clip(rng.normal(200, 40, n), 120, 350)
+        systolic_bp = np.clip(rng.normal(130, 20, n), 90, 200)
+        diastolic_bp = np.clip(rng.normal(80, 15, n), 60, 120)
+        
+        # Physical activity (inversely correlated with age): cumulative Low/Moderate cut-offs
+        activity_draw = rng.random(n)
+        young = age < 50
+        physical_activity = np.where(
+            activity_draw < np.where(young, 0.2, 0.4), 'Low',
+            np.where(activity_draw < np.where(young, 0.7, 0.8), 'Moderate', 'High')
+        )
+        
+        # Lifestyle factors
+        alcohol_consumption = rng.choice(['None', 'Light', 'Moderate', 'Heavy'], n, p=[0.2, 0.4, 0.3, 0.1])
+        stress_level = rng.choice(['Low', 'Moderate', 'High'], n, p=[0.3, 0.5, 0.2])
+        sleep_hours = np.clip(rng.normal(7, 1.5, n), 4, 12)
+        
+        # Geographic factors
+        borough = rng.choice(self.london_boroughs, n)
+        
+        # Calculate CVD risk based on multiple factors
+        risk_score = 0.02 * (age - 18)
+        risk_score += 0.15 * smoker
+        risk_score += 0.1 * family_history
+        risk_score += 0.12 * diabetes
+        risk_score += 0.1 * hypertension
+        risk_score += np.maximum(0, (bmi - 25) * 0.02)
+        risk_score += np.maximum(0, (cholesterol - 200) * 0.001)
+        risk_score += np.maximum(0, (systolic_bp - 120) * 0.002)
+        risk_score -= 0.05 * (physical_activity == 'High')
+        risk_score += 0.05 * (alcohol_consumption == 'Heavy')
+        risk_score += 0.03 * (stress_level == 'High')
+        risk_score -= np.maximum(0, (sleep_hours - 6) * 0.01)
+        
+        # Add some randomness
+        risk_score += rng.normal(0, 0.1, n)
+        
+        yes_no = np.array(['No', 'Yes'])
+        return pd.DataFrame({
+            'Age': age,
+            'Gender': gender,
+            'Smoker': yes_no[smoker.astype(int)],
+            'FamilyHistoryCVD': yes_no[family_history.astype(int)],
+            'Diabetes': yes_no[diabetes.astype(int)],
+            'HighBloodPressure': yes_no[hypertension.astype(int)],
+            'BMI': np.round(bmi, 1),
+            'TotalCholesterol': np.round(cholesterol, 0),
+            'SystolicBP': np.round(systolic_bp, 0),
+            'DiastolicBP': np.round(diastolic_bp, 0),
+            'PhysicalActivityLevel': physical_activity,
+            'AlcoholConsumption': alcohol_consumption,
+            'StressLevel': stress_level,
+            'SleepHours': np.round(sleep_hours, 1),
+            'Borough': borough,
+            'CVD_Risk': (risk_score > 0.3).astype(int)
+        })
+    
+    def collect_additional_environmental_data(self, rng=None):
+        """Generate additional environmental factors, drawn from rng (a NumPy Generator) when given"""
+        rng = rng if rng is not None else np.random.default_rng()
         env_data = []
         
         for borough in self.london_boroughs:
             # Base pollution levels (realistic for London)
-            base_pm25 = np.random.normal(12, 3)
-            base_no2 = np.random.normal(45, 10)
+            base_pm25 = rng.normal(12, 3)
+            base_no2 = rng.normal(45, 10)
             
             # Add seasonal variations
-            seasonal_factor = np.random.uniform(0.8, 1.2)
+            seasonal_factor = rng.uniform(0.8, 1.2)
             
             # Additional environmental factors
-            noise_level = np.random.normal(55, 8)  # dB
-            green_space_pct = np.random.uniform(10, 40)  # % green space
-            walkability_score = np.random.uniform(30, 90)
+            noise_level = rng.normal(55, 8)  # dB
+            green_space_pct = rng.uniform(10, 40)  # % green space
+            walkability_score = rng.uniform(30, 90)
             
             # Urban heat island effect
-            temperature_increase = np.random.uniform(1, 4)  # degrees above rural
+            temperature_increase = rng.uniform(1, 4)  # degrees above rural
             
             record = {
                 'Borough': borough,
@@ -144,28 +266,42 @@ class CVDDataCollector:
         
         return pd.DataFrame(env_data)
     
-    def save_expanded_datasets(self, health_records=500):
-        """Generate and save expanded datasets"""
+    def save_expanded_datasets(self, health_records=500, chunk_size=100000, seed=42):
+        """Generate and save expanded datasets
+        
+        Health records are streamed to CSV in chunks, so large cohorts never
+        have to fit in memory. Both files are reproducible from seed.
+        
+        Returns (number of health records written, environmental DataFrame);
+        the health records themselves are only on disk.
+        """
         print(f"Generating {health_records} health records...")
-        health_df = self.generate_expanded_health_data(health_records)
+        written = self.save_health_data_chunked('user_data/expanded_health_data.csv', health_records,
+                                                chunk_size, seed)
         
         print("Generating expanded environmental data...")
-        env_df = self.collect_additional_environmental_data()
-        
-        # Save to new files
-        health_df.to_csv('user_data/expanded_health_data.csv', index=False)
+        # The root seed's own stream; health blocks use its spawned children
+        env_df = self.collect_additional_environmental_data(np.random.default_rng(seed))
         env_df.to_csv('environmental_data/expanded_environmental_data.csv', index=False)
-        
-        print(f"✓ Saved expanded health data: {len(health_df)} records")
         print(f"✓ Saved expanded environmental data: {len(env_df)} records")
         
-        return health_df, env_df
+        return written, env_df
 
 if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Generate the synthetic CVD datasets')
+    parser.add_argument('--records', type=int, default=1000, help='Health records to generate')
+    parser.add_argument('--chunk-size', type=int, default=100000, help='Records held in memory at once')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed')
+    args = parser.parse_args()
+    
     collector = CVDDataCollector()
-    health_data, env_data = collector.save_expanded_datasets(1000)
+    health_records, env_data = collector.save_expanded_datasets(args.records, args.chunk_size, args.seed)
     
     print("\nDataset Summary:")
-    print(f"Health Records: {len(health_data)}")
+    print(f"Health Records: {health_records}")
     print(f"Environmental Records: {len(env_data)}")
-    print(f"CVD Risk Distribution: {health_data['CVD_Risk'].value_counts().to_dict()}")
\ No newline at end of file
+    # Only the label column is read back, so this stays cheap for large cohorts
+    risk = pd.read_csv('user_data/expanded_health_data.csv', usecols=['CVD_Risk'])['CVD_Risk']
+    print(f"CVD Risk Distribution: {risk.value_counts().to_dict()}")
\ No newline at end of file